@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Times the construction of ReactionSet and ReactionSystem on random models.
+#
+#   $ python3 benchmarks/build_reaction_system.py [size ...]
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fbp_calculator.reactionsystem import Reaction, ReactionSet, ReactionSystem
+
+
+def random_reactions(size, seed=0):
+    rng = random.Random(seed)
+    symbols = ['s{}'.format(i) for i in range(max(size // 10, 10))]
+    reactions = []
+    for _ in range(size):
+        R = rng.sample(symbols, rng.randint(1, 3))
+        P = rng.sample(symbols, rng.randint(1, 2))
+        I = [s for s in rng.sample(symbols, rng.randint(0, 2)) if s not in R]
+        reactions.append(Reaction(R=' '.join(R), P=' '.join(P), I=' '.join(I)))
+    return reactions
+
+
+def main(sizes):
+    print('{:>10} {:>14} {:>18}'.format('reactions', 'ReactionSet', 'ReactionSystem'))
+    for size in sizes:
+        reactions = random_reactions(size)
+
+        start = time.time()
+        A = ReactionSet(reactions)
+        reaction_set_time = time.time() - start
+
+        start = time.time()
+        ReactionSystem(A)
+        reaction_system_time = time.time() - start
+
+        print('{:>10} {:>13.3f}s {:>17.3f}s'.format(
+            len(A), reaction_set_time, reaction_system_time))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
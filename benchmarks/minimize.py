@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Compares the single espresso call at the end of fbp with the partitioned
+# minimization of CubeSet.minimize, on the unminimized fbs of random models.
+#
+#   $ python3 benchmarks/minimize.py [workers [partition_size]]
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pyeda.inter import espresso_exprs
+
+from fbp_calculator.reactionsystem import Reaction, ReactionSet, ReactionSystem
+
+
+MODELS = [(1, 4), (3, 4), (1, 5), (0, 4)]
+
+
+def random_reaction_set(seed, size=10, symbols='abcdef'):
+    rng = random.Random(seed)
+    reactions = []
+    while len(reactions) < size:
+        R = rng.sample(symbols, rng.randint(1, 2))
+        P = rng.sample(symbols, rng.randint(1, 2))
+        I = [s for s in rng.sample(symbols, rng.randint(0, 2)) if s not in R]
+        reactions.append(Reaction(R=' '.join(R), P=' '.join(P), I=' '.join(I)))
+    return ReactionSet(reactions)
+
+
+def expand(seed, steps):
+    rs = ReactionSystem(random_reaction_set(seed))
+    rs._check_query(steps, set(), set(), 'dnf')
+    rs._begin_query([frozenset(['a'])], steps, set(), set())
+    return rs, rs._fbs_iterative(rs._target(frozenset(['a'])), steps)
+
+
+def main(workers, partition_size):
+    print('{:>6} {:>6} {:>8} {:>10} {:>8} {:>12} {:>8}'.format(
+        'model', 'steps', 'cubes', 'espresso', 'cubes', 'partitioned', 'cubes'))
+    for seed, steps in MODELS:
+        rs, cubes = expand(seed, steps)
+
+        start = time.time()
+        formula = espresso_exprs(cubes.to_expr(rs._variables))[0]
+        espresso_time = time.time() - start
+
+        start = time.time()
+        minimized = cubes.minimize(rs._variables, partition_size, workers)
+        partitioned_time = time.time() - start
+
+        print('{:>6} {:>6} {:>8} {:>9.2f}s {:>8} {:>11.2f}s {:>8}'.format(
+            seed, steps, len(cubes), espresso_time, len(formula.xs),
+            partitioned_time, len(minimized)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count(),
+        int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Times the expansion of fbs (without the final espresso call) on random
+# models whose reactions have wide reactant and inhibitor sets, where the
+# causes, and their negations, are And/Or nodes with many operands.
+#
+#   $ python3 benchmarks/wide.py [steps]
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fbp_calculator.reactionsystem import Reaction, ReactionSet, ReactionSystem
+
+
+MODELS = [(16, 2), (16, 4), (16, 8), (16, 12), (16, 16)]
+
+
+def wide_reaction_set(seed, size, width, symbols=32):
+    # width reactants and width/2 inhibitors per reaction, the products
+    # cycling over the first quarter of the symbols.
+    rng = random.Random(seed)
+    symbols = ['s{}'.format(i) for i in range(symbols)]
+    reactions = []
+    while len(reactions) < size:
+        R = rng.sample(symbols, width)
+        I = rng.sample([s for s in symbols if s not in R], width // 2)
+        P = symbols[len(reactions) % (len(symbols) // 4)]
+        reactions.append(Reaction(R=' '.join(R), P=P, I=' '.join(I)))
+    return ReactionSet(reactions)
+
+
+def expand(rs, symbolSet, steps):
+    rs._check_query(steps, set(), set(), 'dnf')
+    rs._begin_query([symbolSet], steps, set(), set())
+    cubes = rs._fbs_target(symbolSet, steps, [steps])[0]
+    rs._end_query()
+    return cubes
+
+
+def main(steps):
+    print('{:>6} {:>6} {:>6} {:>10} {:>8} {:>10}'.format(
+        'size', 'width', 'steps', 'time', 'cubes', 'node_reuse'))
+    for size, width in MODELS:
+        rs = ReactionSystem(wide_reaction_set(0, size, width))
+        start = time.time()
+        cubes = expand(rs, frozenset(['s0']), steps)
+        elapsed = time.time() - start
+        print('{:>6} {:>6} {:>6} {:>9.2f}s {:>8} {:>10.2f}'.format(
+            size, width, steps, elapsed, len(cubes), rs.statistics['node_reuse']))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -1,7 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import os
+import sys
+import threading
 import multiprocessing
 from PyQt5 import QtCore
+try:
+    import resource
+except ImportError:
+    resource = None
 from fbp_calculator.reactionsystem.boolean_wrap import (
     Not,
     Constant,
@@ -11,64 +18,347 @@ from fbp_calculator.reactionsystem.boolean_wrap import (
     AndOp,
     OrOp)
 
-from fbp_calculator.reactionsystem import ReactionSystem, ReactionSet, Reaction
+from fbp_calculator.reactionsystem import (
+    ReactionSystem,
+    ReactionSet,
+    Reaction,
+    ExceptionReactionSystem)
+from fbp_calculator.reactionsystem.fbs_cache import FbsCache
 
 from fbp_calculator.reaction_adapter import reaction_invadapter
+from fbp_calculator.formulafbp import FormulaFileFBP
+from fbp_calculator.modelfbp import ModelFBP
+
+# Worker processes stay alive between calculations, keeping pyeda imported
+# and the ReactionSystems of the last models (with their memoized
+# expansions) around. A worker is replaced after WORKER_MAX_TASKS
+# calculations, or after one that took its peak memory above
+# WORKER_MAX_MEMORY bytes.
+POOL_SIZE = 2
+WORKER_MAX_TASKS = 50
+WORKER_MAX_MEMORY = 1 << 30
+MODEL_CACHE_SIZE = 8
+
+# The messages a worker sends back for a task: any number of progress
+# events of the engine, then the result.
+MESSAGE_PROGRESS = 'progress'
+MESSAGE_RESULT = 'result'
+
+# A calculation is stopped by setting the cancel flag its worker shares
+# with the application: the engine then returns early with what it has
+# computed. A worker that does not answer within STOP_TIMEOUT seconds (in
+# the middle of a minimization, say) is terminated.
+STOP_TIMEOUT = 1.0
+
 
 class QThreadCalculatorFBP(QtCore.QThread):
-    def __init__(self, dialog):
+    progress = QtCore.pyqtSignal(dict)
+
+    def __init__(self, dialog, sweep=False):
         self.stopped = False
+        self.interrupted = False
 
-        self.result = multiprocessing.Manager().dict()
+        self.result = {}
         self.result['completed'] = False
+        self.result['partial'] = False
+        self.result['truncated'] = False
         self.result['formula'] = None
         self.result['formula_table'] = None
+        self.result['formulas'] = None
+        self.result['formula_tables'] = None
+        # The mapped file holding every formula of the result.
+        self._formula_file = None
 
-        self._process = ProcessCalculateFBP(
+        self._task = (
             dialog.steps,
             dialog.symbols,
-            dialog.reaction_set,
-            dialog.context_given_set,
-            dialog.context_not_given_set,
-            self.result)
-        self._process.daemon = True
+            dialog.model,
+            dialog.max_literals,
+            dialog.top_k,
+            sweep)
+        # The worker running the task, which stop and interrupt cancel: it
+        # is only set while the task is in progress.
+        self._worker = None
+        self._timer = None
+        self._lock = threading.Lock()
 
         super(QThreadCalculatorFBP, self).__init__()
 
     def run(self):
-        self._process.start()
-        self._process.join()
+        pool = PoolCalculatorFBP.instance()
+        worker = pool.acquire()
+        with self._lock:
+            if self.stopped:
+                pool.release(worker)
+                return
+            self._worker = worker
+            worker[2].value = self.interrupted
+
+        process, connection, cancel_flag = worker
+        try:
+            connection.send(self._task)
+            while True:
+                message = connection.recv()
+                if message[0] != MESSAGE_PROGRESS:
+                    break
+                self.progress.emit(message[1])
+            _, result, recycle = message
+        except (EOFError, OSError):
+            result, recycle = None, True
+
+        with self._lock:
+            self._worker = None
+            if self._timer is not None:
+                self._timer.cancel()
+        pool.release(worker, recycle)
+
+        if result is None:
+            return
+        path = result['formula'] if 'formula' in result else result['formulas']
+        try:
+            self._formula_file = FormulaFileFBP(path)
+        except (OSError, ValueError):
+            try:
+                os.remove(path)
+            except OSError: pass
+            return
+        formulas = self._formula_file.formulas
+        formula_tables = [formula if isinstance(formula, bool) else formula.table
+            for formula in formulas]
+        if 'formula' in result:
+            self.result['formula'] = formulas[0]
+            self.result['formula_table'] = formula_tables[0]
+        else:
+            self.result['formulas'] = formulas
+            self.result['formula_tables'] = formula_tables
+        self.result['partial'] = result['partial']
+        self.result['truncated'] = result['truncated']
+        self.result['completed'] = True
+
+        if self.stopped:
+            self.close()
+
+    def close(self):
+        # Unmaps (and removes) the formula file of the result.
+        if self._formula_file is not None:
+            self._formula_file.close()
+
+    def interrupt(self):
+        # Stops the calculation, which still completes with the predictors
+        # found so far.
+        with self._lock:
+            self.interrupted = True
+            if self._worker is not None:
+                self._worker[2].value = True
 
     def stop(self):
-        self.stopped = True
+        with self._lock:
+            self.stopped = True
+            if self._worker is not None:
+                self._worker[2].value = True
+                self._timer = threading.Timer(STOP_TIMEOUT, self._terminate, (self._worker,))
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _terminate(self, worker):
+        with self._lock:
+            if self._worker is worker:
+                try:
+                    worker[0].terminate()
+                except Exception: pass
+
+
+class PoolCalculatorFBP():
+    _instance = None
+
+    @staticmethod
+    def instance():
+        if PoolCalculatorFBP._instance is None:
+            PoolCalculatorFBP._instance = PoolCalculatorFBP()
+        return PoolCalculatorFBP._instance
+
+    def __init__(self, size=POOL_SIZE,
+            max_tasks=WORKER_MAX_TASKS, max_memory=WORKER_MAX_MEMORY):
+        self.size = size
+        self.max_tasks = max_tasks
+        self.max_memory = max_memory
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        # The workers are spawned without holding the lock, which would
+        # otherwise keep acquire waiting for them.
+        while True:
+            with self._lock:
+                if len(self._idle) >= self.size:
+                    return
+            worker = self._spawn()
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append(worker)
+                    continue
+            PoolCalculatorFBP._close(worker)
+            return
+
+    def acquire(self):
+        with self._lock:
+            # The oldest worker first: the newest may still be importing.
+            while self._idle:
+                worker = self._idle.pop(0)
+                if worker[0].is_alive():
+                    return worker
+            return self._spawn()
+
+    def release(self, worker, recycle=False):
+        process, connection, cancel_flag = worker
+        with self._lock:
+            if not recycle and process.is_alive() and len(self._idle) < self.size:
+                self._idle.append(worker)
+                return
+        PoolCalculatorFBP._close(worker)
+        if recycle:
+            self.start()
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            PoolCalculatorFBP._close(worker)
+
+    def _spawn(self):
+        connection, worker_connection = multiprocessing.Pipe()
+        cancel_flag = multiprocessing.RawValue('b', False)
+        process = ProcessCalculateFBP(worker_connection, cancel_flag,
+            self.max_tasks, self.max_memory)
+        process.daemon = True
+        process.start()
+        worker_connection.close()
+        return process, connection, cancel_flag
+
+    @staticmethod
+    def _close(worker):
+        process, connection, cancel_flag = worker
         try:
-            self._process.terminate()
+            if process.is_alive():
+                connection.send(None)
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+                process.join()
         except Exception: pass
+        connection.close()
 
 
 class ProcessCalculateFBP(multiprocessing.Process):
-    def __init__(self, steps, symbols, reaction_set, context_given_set, context_not_given_set, result):
-        self.steps = steps
-        self.symbols = symbols
-        self.reaction_set = reaction_set
-        self.context_given_set = context_given_set
-        self.context_not_given_set = context_not_given_set
-        self.result = result
+    def __init__(self, connection, cancel_flag,
+            max_tasks=WORKER_MAX_TASKS, max_memory=WORKER_MAX_MEMORY):
+        self.connection = connection
+        self.cancel_flag = cancel_flag
+        self.max_tasks = max_tasks
+        self.max_memory = max_memory
         
         super(ProcessCalculateFBP, self).__init__()
 
     def run(self):
-        self.rs = ReactionSystem(self.reaction_set)
+        reaction_systems = FbsCache(MODEL_CACHE_SIZE)
+        tasks = 0
+        while True:
+            try:
+                task = self.connection.recv()
+            except (EOFError, OSError):
+                return
+            if task is None:
+                return
+
+            steps, symbols, model, max_literals, top_k, sweep = task
+
+            try:
+                model = ModelFBP(model)
+                rs = reaction_systems.get(model.key())
+                if rs is None:
+                    rs = ReactionSystem(model.reaction_set())
+                    reaction_systems.put(model.key(), rs)
+                context_given_set, context_not_given_set = model.context_sets()
+
+                rs.progress = self._send_progress
+                rs.cancelled = self._cancelled
+                try:
+                    result = ProcessCalculateFBP.calculate(rs,
+                        steps, symbols, context_given_set, context_not_given_set,
+                        max_literals, top_k, sweep)
+                finally:
+                    rs.progress = None
+                    rs.cancelled = None
+            except Exception:
+                result = None
+
+            tasks += 1
+            recycle = tasks >= self.max_tasks or _peak_memory() > self.max_memory
+            self.connection.send((MESSAGE_RESULT, result, recycle))
+            if recycle:
+                return
 
-        formula = self.rs.fbp(
-            self.symbols, self.steps-1,
-            self.context_given_set, self.context_not_given_set)
+    def _send_progress(self, event):
+        self.connection.send((MESSAGE_PROGRESS, event))
 
+    def _cancelled(self):
+        return self.cancel_flag.value
+
+    @staticmethod
+    def calculate(rs, steps, symbols, context_given_set, context_not_given_set,
+            max_literals=None, top_k=None, sweep=False):
+        if sweep:
+            if max_literals is None and top_k is None:
+                formulas, partial, truncated = ProcessCalculateFBP._fbp(rs, rs.fbp_sweep,
+                    symbols, steps-1,
+                    context_given_set, context_not_given_set)
+            else:
+                results = [ProcessCalculateFBP._fbp(rs, rs.fbp,
+                        symbols, step,
+                        context_given_set, context_not_given_set,
+                        max_literals=max_literals, top_k=top_k)
+                    for step in range(steps)]
+                formulas = [formula for formula, _, _ in results]
+                partial = any(partial for _, partial, _ in results)
+                truncated = any(truncated for _, _, truncated in results)
+
+            return {
+                'formulas': ProcessCalculateFBP.write(formulas),
+                'partial': partial,
+                'truncated': truncated}
+
+        formula, partial, truncated = ProcessCalculateFBP._fbp(rs, rs.fbp,
+            symbols, steps-1,
+            context_given_set, context_not_given_set,
+            max_literals=max_literals, top_k=top_k)
+
+        return {
+            'formula': ProcessCalculateFBP.write([formula]),
+            'partial': partial,
+            'truncated': truncated}
+
+    @staticmethod
+    def _fbp(rs, function, *args, **kwargs):
+        # A cancelled calculation returns what the engine had computed, a
+        # formula implying the exact one, flagged as partial. A bounded one
+        # is flagged as truncated when the bounds left predictors out.
+        try:
+            formula, partial = function(*args, **kwargs), False
+        except ExceptionReactionSystem.Cancelled as e:
+            formula, partial = e.result, True
+        return formula, partial, rs.statistics.get('truncated', False)
+
+    @staticmethod
+    def write(formulas):
+        # The formulas are sent as the path of one FormulaFileFBP file,
+        # however many of them there are.
+        return FormulaFileFBP.write([ProcessCalculateFBP.convert(formula)
+            for formula in formulas])
+
+    @staticmethod
+    def convert(formula):
         if isinstance(formula, Constant):
-            self.result['completed'] = True
-            self.result['formula'] = formula.VALUE
-            self.result['formula_table'] = formula.VALUE
-            return
+            return formula.VALUE
 
         if isinstance(formula, Literal):
             formula_list_or = [[ProcessCalculateFBP.case_literal(formula)]]
@@ -81,24 +371,8 @@ class ProcessCalculateFBP(multiprocessing.Process):
         
         formula_list_or = list(map(lambda x: sorted(x), formula_list_or))
         formula_list_or.sort()
-        
-        formula_table_or = []
-        for formula_list_and in formula_list_or:
-            formula_dict_and = {}
-            for formula in formula_list_and:
-                n, s = formula
-                n -= 1
-                if n in formula_dict_and:
-                    formula_dict_and[n] += ' ' + s
-                else:
-                   formula_dict_and[n] = s
-            formula_table_or.append(formula_dict_and)
-
-
-        self.result['completed'] = True
-        self.result['formula'] = formula_list_or
-        self.result['formula_table'] = formula_table_or
 
+        return formula_list_or
 
     @staticmethod
     def case_literal(formula):
@@ -129,3 +403,11 @@ class ProcessCalculateFBP(multiprocessing.Process):
             elif isinstance(formula_and, AndOp):
                 formula_list_or.append(ProcessCalculateFBP.case_andOp(formula_and))
         return formula_list_or
+
+
+def _peak_memory():
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, in kilobytes elsewhere.
+    return peak if sys.platform == 'darwin' else peak * 1024
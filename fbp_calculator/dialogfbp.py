@@ -9,7 +9,7 @@ from fbp_calculator.reaction_adapter import reaction_invadapter
 
 class DialogFBP(QtWidgets.QDialog, Ui_DialogFBP):
     def __init__(self, parent,
-            symbols, steps, reaction_set, context_given_set, context_not_given_set):
+            symbols, steps, model, max_literals=None, top_k=None):
         super(DialogFBP, self).__init__(parent)
         self.setupUi(self)
 
@@ -23,30 +23,71 @@ class DialogFBP(QtWidgets.QDialog, Ui_DialogFBP):
 
         self.symbols = symbols
         self.steps = steps
-        self.reaction_set = reaction_set
-        self.context_given_set = context_given_set
-        self.context_not_given_set = context_not_given_set
+        self.horizon = steps
+        self.model = model
+        self.max_literals = max_literals
+        self.top_k = top_k
 
         self.lineEditSymbols.setText(reaction_invadapter(self.symbols))
         self.lineEditSteps.setText(str(self.steps))
+        bounds = []
+        if self.max_literals is not None:
+            bounds.append('≤ {} literals'.format(self.max_literals))
+        if self.top_k is not None:
+            bounds.append('top {}'.format(self.top_k))
+        self.lineEditBounds.setText(', '.join(bounds))
+        self.labelBounds.setVisible(bool(bounds))
+        self.lineEditBounds.setVisible(bool(bounds))
         
         self.labelLoadingImage.setMovie(QtGui.QMovie(":/loader.gif"))
         self.labelLoadingImage.movie().start()
 
         self.toolButtonSave.setVisible(False)
         self.toolButtonSave.clicked.connect(self.toolButtonSave_clicked)
+        self.toolButtonStop.clicked.connect(self.toolButtonStop_clicked)
 
         self.comboBoxFormulaType.currentIndexChanged.connect(self.comboBoxFormulaType_currentIndexChanged)
 
+        self.spinBoxHorizon.setVisible(False)
+        self.spinBoxHorizon.setMaximum(self.steps)
+        self.spinBoxHorizon.setValue(self.steps)
+        self.spinBoxHorizon.valueChanged.connect(self.spinBoxHorizon_valueChanged)
+        self.checkBoxAllHorizons.toggled.connect(self.checkBoxAllHorizons_toggled)
+
         self.listFormula.verticalScrollBar().valueChanged.connect(self.listFormula_scrollBar_valueChanged)
         self.tableWidgetFormula.horizontalScrollBar().valueChanged.connect(self.tableWidgetFormula_horizontalScrollBar_valueChanged)
         self.tableWidgetFormula.verticalScrollBar().valueChanged.connect(self.tableWidgetFormula_verticalScrollBar_valueChanged)
 
 
+        self.formulas = None
+        self.formula_tables = None
+        self.QThreadCalculatorSweep = None
+
         self.QThreadCalculatorFBP = QThreadCalculatorFBP(self)
+        self.QThreadCalculatorFBP.progress.connect(self.QThread_progressCalculatorFBP)
         self.QThreadCalculatorFBP.finished.connect(self.QThread_finishedCalculatorFBP)
         self.QThreadCalculatorFBP.start()
 
+    def toolButtonStop_clicked(self):
+        self.toolButtonStop.setEnabled(False)
+        self.QThreadCalculatorFBP.interrupt()
+        if self.QThreadCalculatorSweep is not None:
+            self.QThreadCalculatorSweep.interrupt()
+
+    def labelComputing_showPartial(self, stopped=True):
+        self.labelComputing.setStyleSheet("QLabel { color : darkorange; font-weight:600; }")
+        if stopped:
+            self.labelComputing.setText('Stopped: predictors found so far')
+            self.labelComputing.setToolTip(
+                'The calculation was stopped: every predictor shown is a predictor, '
+                'but some may be missing')
+        else:
+            self.labelComputing.setText('Bounded: predictors within the bounds')
+            self.labelComputing.setToolTip(
+                'The bounds left some predictors out: every predictor shown is a '
+                'predictor, but some may be missing')
+        self.labelComputing.setVisible(True)
+
     def toolButtonSave_clicked(self):
         formulaType_index = self.comboBoxFormulaType.currentIndex()
         if formulaType_index == 0:
@@ -106,7 +147,7 @@ class DialogFBP(QtWidgets.QDialog, Ui_DialogFBP):
                 worksheet.write(0, 0, str(self.formula))
 
             else:
-                for i in range(0, self.steps):
+                for i in range(0, self.horizon):
                     worksheet.write(0, i, str(i+1))
 
                 for i in range(0, len(self.formula_table)):
@@ -138,8 +179,36 @@ class DialogFBP(QtWidgets.QDialog, Ui_DialogFBP):
     def closeEvent(self, event):
         self.QThreadCalculatorFBP.stop()
         self.QThreadCalculatorFBP.wait()
+        self.QThreadCalculatorFBP.close()
+        if self.QThreadCalculatorSweep is not None:
+            self.QThreadCalculatorSweep.stop()
+            self.QThreadCalculatorSweep.wait()
+            self.QThreadCalculatorSweep.close()
         event.accept()
     
+    def QThread_progressCalculatorFBP(self, event):
+        if self.sender().stopped:
+            return
+
+        elapsed = sum(event['elapsed'].values())
+        text = 'Computing: {}'.format(event['phase'])
+        if event['step'] is not None:
+            text += ', step {}'.format(event['step']+1)
+        self.labelComputing.setText('{}, {:.1f}s'.format(text, elapsed))
+
+        details = ['Phase: {}'.format(event['phase'])]
+        if event['step'] is not None:
+            details.append('Step: {}'.format(event['step']+1))
+        details.append('Stack depth: {}'.format(event['stack']))
+        details.append('Memo entries: {}'.format(event['memo']))
+        if event['cubes'] is not None:
+            details.append('Cubes: {} (largest {})'.format(event['cubes'], event['max_cubes']))
+        if event['max_literals'] is not None:
+            details.append('Max literals: {}'.format(event['max_literals']))
+        for phase in sorted(event['elapsed']):
+            details.append('{}: {:.1f}s'.format(phase.capitalize(), event['elapsed'][phase]))
+        self.labelComputing.setToolTip('\n'.join(details))
+
     def QThread_finishedCalculatorFBP(self):
         if self.QThreadCalculatorFBP.stopped:
             return
@@ -147,6 +216,8 @@ class DialogFBP(QtWidgets.QDialog, Ui_DialogFBP):
         self.labelLoadingImage.setVisible(False)
         self.labelLoadingImage.movie().stop()
         self.labelComputing.setVisible(False)
+        self.labelComputing.setToolTip('')
+        self.toolButtonStop.setVisible(False)
 
         if not self.QThreadCalculatorFBP.result['completed']:
             self.labelComputing.setStyleSheet("QLabel { color : red; font-weight:600; }")
@@ -156,14 +227,92 @@ class DialogFBP(QtWidgets.QDialog, Ui_DialogFBP):
         
         self.formula = self.QThreadCalculatorFBP.result['formula']
         self.formula_table = self.QThreadCalculatorFBP.result['formula_table']
+        if self.QThreadCalculatorFBP.result['partial']:
+            self.labelComputing_showPartial()
+        elif self.QThreadCalculatorFBP.result['truncated']:
+            self.labelComputing_showPartial(stopped=False)
 
         self.toolButtonSave.setVisible(True)
+        self.checkBoxAllHorizons.setEnabled(True)
 
         self.comboBoxFormulaType.setEnabled(True)
         self.comboBoxFormulaType_currentIndexChanged(self.formulaType_defaultIndex)
 
         self.raise_()
 
+    def QThread_finishedCalculatorSweep(self):
+        if self.QThreadCalculatorSweep.stopped:
+            return
+
+        self.labelLoadingImage.setVisible(False)
+        self.labelLoadingImage.movie().stop()
+        self.labelComputing.setVisible(False)
+        self.labelComputing.setToolTip('')
+        self.toolButtonStop.setVisible(False)
+        self.checkBoxAllHorizons.setEnabled(True)
+
+        if not self.QThreadCalculatorSweep.result['completed']:
+            self.labelComputing.setStyleSheet("QLabel { color : red; font-weight:600; }")
+            self.labelComputing.setText('Error during the fbp calculation')
+            self.labelComputing.setVisible(True)
+            self.checkBoxAllHorizons.setChecked(False)
+            return
+
+        self.formulas = self.QThreadCalculatorSweep.result['formulas']
+        self.formula_tables = self.QThreadCalculatorSweep.result['formula_tables']
+        if (self.QThreadCalculatorSweep.result['partial'] or
+                self.QThreadCalculatorFBP.result['partial']):
+            self.labelComputing_showPartial()
+        elif (self.QThreadCalculatorSweep.result['truncated'] or
+                self.QThreadCalculatorFBP.result['truncated']):
+            self.labelComputing_showPartial(stopped=False)
+
+        if self.checkBoxAllHorizons.isChecked():
+            self.spinBoxHorizon.setEnabled(True)
+
+    def checkBoxAllHorizons_toggled(self, checked):
+        self.spinBoxHorizon.setVisible(checked)
+        if not checked:
+            self.spinBoxHorizon.setValue(self.steps)
+            return
+
+        if self.formulas is not None:
+            self.spinBoxHorizon.setEnabled(True)
+            return
+
+        self.checkBoxAllHorizons.setEnabled(False)
+        self.labelComputing.setStyleSheet('')
+        self.labelComputing.setText('Computing')
+        self.labelComputing.setVisible(True)
+        self.labelLoadingImage.setVisible(True)
+        self.labelLoadingImage.movie().start()
+        self.toolButtonStop.setEnabled(True)
+        self.toolButtonStop.setVisible(True)
+
+        self.QThreadCalculatorSweep = QThreadCalculatorFBP(self, sweep=True)
+        self.QThreadCalculatorSweep.progress.connect(self.QThread_progressCalculatorFBP)
+        self.QThreadCalculatorSweep.finished.connect(self.QThread_finishedCalculatorSweep)
+        self.QThreadCalculatorSweep.start()
+
+    def spinBoxHorizon_valueChanged(self, value):
+        if self.formulas is None or value == self.horizon:
+            return
+
+        self.horizon = value
+        self.formula = self.formulas[value-1]
+        self.formula_table = self.formula_tables[value-1]
+
+        self.textBrowserFormula.clear()
+        self.textBrowserFormula.setEnabled(False)
+        self.listFormula.clear()
+        self.listFormula.setEnabled(False)
+        self.tableWidgetFormula.setRowCount(0)
+        self.tableWidgetFormula.setColumnCount(0)
+        self.tableWidgetFormula.horizontalHeader().setVisible(True)
+        self.tableWidgetFormula.setEnabled(False)
+
+        self.comboBoxFormulaType_currentIndexChanged(self.comboBoxFormulaType.currentIndex())
+
 
     def comboBoxFormulaType_currentIndexChanged(self, index):
         if index == 0:
@@ -314,7 +463,7 @@ class DialogFBP(QtWidgets.QDialog, Ui_DialogFBP):
                 or isinstance(self.formula, bool)):
             return
         
-        for _ in range(self.tableWidgetFormula.columnCount(), self.steps):
+        for _ in range(self.tableWidgetFormula.columnCount(), self.horizon):
             if self.tableWidgetFormula.horizontalScrollBar().maximum() != 0:
                 break
             self.tableWidgetFormula_addColumn()
@@ -332,7 +481,7 @@ class DialogFBP(QtWidgets.QDialog, Ui_DialogFBP):
         if (not self.tableWidgetFormula.isEnabled()) or isinstance(self.formula, bool):
             return
 
-        if (self.tableWidgetFormula.columnCount() < self.steps and
+        if (self.tableWidgetFormula.columnCount() < self.horizon and
                 value == self.tableWidgetFormula.horizontalScrollBar().maximum()):
             self.tableWidgetFormula_addColumn()
 
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+import os
+import mmap
+import struct
+import tempfile
+from array import array
+
+
+# The file a calculator process writes its formulas to: a header, the
+# offset of every formula in the file (0 and 1 standing for the constants
+# False and True), and the DNF formulas. Each of them is a header, the
+# names of its literals, the offset of every cube in the literals, and the
+# literals as (index, name id) pairs. The dialog maps the file once, however
+# many formulas it holds, and decodes a cube only when a view asks for it.
+FILE_HEADER = struct.Struct('=4sI')
+FILE_MAGIC = b'FBPS'
+HEADER = struct.Struct('=4sIII')
+MAGIC = b'FBP1'
+
+
+class FormulaFileFBP():
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            os.remove(path)
+            self._path = None
+        except OSError:
+            # Windows does not remove a mapped file: it is removed on close.
+            self._path = path
+
+        self._view = memoryview(self._map)
+        self.formulas = []
+        try:
+            magic, count = FILE_HEADER.unpack_from(self._map, 0)
+            if magic != FILE_MAGIC:
+                raise ValueError('{} is not a formula file'.format(path))
+            offsets = array('I', bytes(self._view[FILE_HEADER.size:FILE_HEADER.size+4*count]))
+            for offset in offsets:
+                if offset < FILE_HEADER.size:
+                    self.formulas.append(bool(offset))
+                else:
+                    self.formulas.append(FormulaFBP(self._view, offset))
+        except Exception:
+            self.close()
+            raise
+
+    @staticmethod
+    def write(formulas):
+        # formulas are lists of cubes, as ProcessCalculateFBP.convert returns
+        # them, or the constants True and False.
+        offsets = array('I')
+        descriptor, path = tempfile.mkstemp(prefix='fbp-', suffix='.formula')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(FILE_HEADER.pack(FILE_MAGIC, len(formulas)))
+                file.write(bytes(4*len(formulas)))
+                for formula in formulas:
+                    if isinstance(formula, bool):
+                        offsets.append(int(formula))
+                    else:
+                        offsets.append(file.tell())
+                        FormulaFBP.write(file, formula)
+                file.seek(FILE_HEADER.size)
+                offsets.tofile(file)
+        except Exception:
+            os.remove(path)
+            raise
+        return path
+
+    def close(self):
+        if self._map.closed:
+            return
+        for formula in self.formulas:
+            if isinstance(formula, FormulaFBP):
+                formula.close()
+        self._view.release()
+        self._map.close()
+        if self._path is not None:
+            try:
+                os.remove(self._path)
+            except OSError: pass
+
+
+class FormulaFBP():
+    def __init__(self, view, offset):
+        magic, names_size, cubes, literals = HEADER.unpack_from(view, offset)
+        if magic != MAGIC:
+            raise ValueError('no formula at offset {}'.format(offset))
+
+        offset += HEADER.size
+        names = bytes(view[offset:offset+names_size]).decode('utf-8').rstrip('\0')
+        self._names = names.split('\n')
+        offset += names_size
+
+        self._offsets = view[offset:offset+4*(cubes+1)].cast('I')
+        offset += 4*(cubes+1)
+        self._literals = view[offset:offset+8*literals].cast('I')
+
+        self._cube = (None, None)
+        self.table = FormulaTableFBP(self)
+
+    @staticmethod
+    def write(file, formula_list_or):
+        names = {}
+        offsets = array('I', [0])
+        literals = array('I')
+        for formula_list_and in formula_list_or:
+            for n, s in formula_list_and:
+                literals.append(n)
+                literals.append(names.setdefault(s, len(names)))
+            offsets.append(len(literals) // 2)
+
+        names = '\n'.join(sorted(names, key=names.get)).encode('utf-8')
+        names += b'\0' * (-len(names) % 4)
+
+        file.write(HEADER.pack(MAGIC, len(names), len(offsets) - 1, len(literals) // 2))
+        file.write(names)
+        offsets.tofile(file)
+        literals.tofile(file)
+
+    def close(self):
+        self._offsets.release()
+        self._literals.release()
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+
+        # The views ask for the literals of a cube one at a time.
+        if self._cube[0] != i:
+            literals = self._literals
+            self._cube = (i, [[literals[2*j], self._names[literals[2*j+1]]]
+                for j in range(self._offsets[i], self._offsets[i+1])])
+        return self._cube[1]
+
+
+class FormulaTableFBP():
+    def __init__(self, formula):
+        self._formula = formula
+
+    def __len__(self):
+        return len(self._formula)
+
+    def __getitem__(self, i):
+        formula_dict_and = {}
+        for n, s in self._formula[i]:
+            n -= 1
+            if n in formula_dict_and:
+                formula_dict_and[n] += ' ' + s
+            else:
+                formula_dict_and[n] = s
+        return formula_dict_and
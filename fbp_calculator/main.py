@@ -2,11 +2,18 @@ import sys
 import multiprocessing
 from PyQt5 import QtWidgets
 from fbp_calculator.mainwindowfbp import MainWindowFBP
+from fbp_calculator.calculatorfbp import PoolCalculatorFBP
 
 def main():
     multiprocessing.freeze_support()
 
+    pool = PoolCalculatorFBP.instance()
+    pool.start()
+
     app = QtWidgets.QApplication(sys.argv)
     mainWindowFBP = MainWindowFBP(app)
     mainWindowFBP.show()
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+
+    pool.shutdown()
+    sys.exit(exit_code)
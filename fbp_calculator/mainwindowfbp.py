@@ -1,14 +1,13 @@
 # -*- coding: utf-8 -*-
 
 import re
-from copy import deepcopy
 from PyQt5 import QtCore, QtGui, QtWidgets
 from fbp_calculator.reactionsystem import (
     Reaction,
-    ReactionSet,
     ExceptionReactionSystem)
 from fbp_calculator.ui_mainwindowfbp import Ui_MainWindowFBP
 from fbp_calculator.dialogfbp import DialogFBP
+from fbp_calculator.modelfbp import ModelFBP
 from fbp_calculator.reaction_adapter import reaction_adapter, reaction_invadapter
 from fbp_calculator import __version__
 
@@ -92,6 +91,8 @@ class MainWindowFBP(QtWidgets.QMainWindow, Ui_MainWindowFBP):
             return
             
         self.spinBoxCalculatorSteps.setValue(1)
+        self.spinBoxCalculatorMaxLiterals.setValue(0)
+        self.spinBoxCalculatorTopK.setValue(0)
         self.tableWidgetProperties.cellWidget(0,0).setText('')
         self.tableWidgetProperties.cellWidget(1,0).setText('')
         self.lineEditCalculatorSymbols.setText('')
@@ -286,11 +287,12 @@ class MainWindowFBP(QtWidgets.QMainWindow, Ui_MainWindowFBP):
             return
 
         DialogFBP(self,
-            deepcopy(reaction_adapter(self.lineEditCalculatorSymbols.text())),
-            deepcopy(self.spinBoxCalculatorSteps.value()),
-            ReactionSet(deepcopy(self.reaction_list)),
-            deepcopy(self.context_given_set[0]),
-            deepcopy(self.context_given_set[1])
+            reaction_adapter(self.lineEditCalculatorSymbols.text()),
+            self.spinBoxCalculatorSteps.value(),
+            ModelFBP.encode(self.reaction_list,
+                self.context_given_set[0], self.context_given_set[1]),
+            self.spinBoxCalculatorMaxLiterals.value() or None,
+            self.spinBoxCalculatorTopK.value() or None
         ).show()
 
     def pushButtonCalculate_generateContextPropertieSet(self):
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+import struct
+from array import array
+
+from fbp_calculator.reactionsystem import ReactionSet, Reaction
+
+
+# The buffer a model is handed to the calculator processes in. The reaction
+# section: the sizes, the names of the symbols of the reactions, the offsets
+# of the R, I and P sets of every reaction in the symbol ids, and the ids.
+# The context section: the sizes, the names of the symbols only found in the
+# context, and a bitmap of the symbols per step for the context given and
+# not given sets. The reaction section is the key the processes cache the
+# ReactionSystems on.
+MAGIC = b'MDL1'
+REACTIONS = struct.Struct('=III')
+CONTEXT = struct.Struct('=II')
+
+
+class ModelFBP():
+    def __init__(self, buffer):
+        self.buffer = buffer
+        view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError('not a model buffer')
+
+        offset = len(MAGIC)
+        names_size, reactions, ids = REACTIONS.unpack_from(view, offset)
+        offset += REACTIONS.size
+        names = ModelFBP._names(view[offset:offset+names_size])
+        offset += names_size
+        self._offsets = array('I', bytes(view[offset:offset+4*(3*reactions+1)]))
+        offset += 4*(3*reactions+1)
+        self._ids = array('I', bytes(view[offset:offset+4*ids]))
+        offset += 4*ids
+        self._key = bytes(view[len(MAGIC):offset])
+
+        names_size, self._steps = CONTEXT.unpack_from(view, offset)
+        offset += CONTEXT.size
+        self._names = names + ModelFBP._names(view[offset:offset+names_size])
+        offset += names_size
+        self._context = offset
+
+    @staticmethod
+    def encode(reactions, context_given_set, context_not_given_set):
+        # Equal reaction sets are encoded the same way, whatever their order.
+        reactions = sorted(reactions, key=str)
+        ids = {}
+        for reaction in reactions:
+            for symbol in sorted(reaction.R | reaction.I | reaction.P):
+                ids.setdefault(symbol, len(ids))
+        reaction_names = len(ids)
+        for context in (context_given_set, context_not_given_set):
+            for _, symbol in sorted(context):
+                ids.setdefault(symbol, len(ids))
+        names = sorted(ids, key=ids.get)
+
+        offsets = array('I', [0])
+        symbol_ids = array('I')
+        for reaction in reactions:
+            for symbol_set in (reaction.R, reaction.I, reaction.P):
+                symbol_ids.extend(sorted(ids[symbol] for symbol in symbol_set))
+                offsets.append(len(symbol_ids))
+
+        steps = max([step+1 for step, _ in context_given_set | context_not_given_set] or [0])
+        size = (len(ids) + 7) // 8
+        bitmaps = []
+        for context in (context_given_set, context_not_given_set):
+            bitmap = [0] * steps
+            for step, symbol in context:
+                bitmap[step] |= 1 << ids[symbol]
+            bitmaps.extend(mask.to_bytes(size, 'little') for mask in bitmap)
+
+        context_names = ModelFBP._encode_names(names[reaction_names:])
+        reaction_names = ModelFBP._encode_names(names[:reaction_names])
+        return b''.join([
+            MAGIC,
+            REACTIONS.pack(len(reaction_names), len(offsets) // 3, len(symbol_ids)),
+            reaction_names,
+            offsets.tobytes(),
+            symbol_ids.tobytes(),
+            CONTEXT.pack(len(context_names), steps),
+            context_names] + bitmaps)
+
+    @staticmethod
+    def _encode_names(names):
+        names = '\n'.join(names).encode('utf-8')
+        return names + b'\0' * (-len(names) % 4)
+
+    @staticmethod
+    def _names(view):
+        names = bytes(view).decode('utf-8').rstrip('\0')
+        return names.split('\n') if names else []
+
+    def key(self):
+        return self._key
+
+    def reaction_set(self):
+        offsets, ids, names = self._offsets, self._ids, self._names
+        reactions = []
+        for i in range(0, len(offsets) - 1, 3):
+            R, I, P = [' '.join(names[ids[j]] for j in range(offsets[i+k], offsets[i+k+1]))
+                for k in range(3)]
+            reactions.append(Reaction(R=R, P=P, I=I))
+        return ReactionSet(reactions)
+
+    def context_sets(self):
+        size = (len(self._names) + 7) // 8
+        view = memoryview(self.buffer)
+        context_sets = []
+        offset = self._context
+        for _ in range(2):
+            context = set()
+            for step in range(self._steps):
+                mask = int.from_bytes(bytes(view[offset:offset+size]), 'little')
+                offset += size
+                symbol = 0
+                while mask:
+                    if mask & 1:
+                        context.add((step, self._names[symbol]))
+                    mask >>= 1
+                    symbol += 1
+            context_sets.append(context)
+        return context_sets[0], context_sets[1]
@@ -14,6 +14,12 @@ from pyeda.boolalg.expr import (
     AndOp,
     OrOp,
     OrAndOp)
+from pyeda.boolalg.bdd import (
+    bddvar,
+    bdd2expr,
+    BDDZERO,
+    BDDONE)
+from pyeda.boolalg.picosat import satisfy_one
 
 ZERO = expr(False)
 ONE = expr(True)
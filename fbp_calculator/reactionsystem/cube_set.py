@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+
+from pyeda.inter import espresso_exprs
+from pyeda.boolalg.expr import Atom
+
+from fbp_calculator.reactionsystem.boolean_wrap import (
+    Not,
+    And,
+    Or,
+    Constant,
+    Complement,
+    AndOp,
+    OrOp)
+from fbp_calculator.reactionsystem.variable_table import VariableTable
+
+
+# Below this many cubes, absorbing one side of a union into the other scans
+# the cubes instead of indexing them by literal.
+ABSORB_SCAN_SIZE = 16
+
+
+# A cube is a pair of bitmasks (positive, negative) over the ids of a
+# VariableTable, and a CubeSet is the DNF (Or) of its cubes. A truncated
+# CubeSet is missing some cubes longer than the max_literals of a product
+# it comes from: the ones it has are exactly the shorter cubes.
+class CubeSet():
+    def __init__(self, cubes=frozenset(), truncated=False):
+        self.cubes = cubes
+        self.truncated = truncated
+
+    @staticmethod
+    def constant(value):
+        if value:
+            return CubeSet(frozenset([(0, 0)]))
+        return CubeSet()
+
+    @staticmethod
+    def from_expr(formula, variable_table):
+        # formula must be a DNF, as returned by espresso_exprs.
+        if isinstance(formula, Constant):
+            return CubeSet.constant(formula.VALUE)
+        terms = formula.xs if isinstance(formula, OrOp) else [formula]
+        cubes = set()
+        for term in terms:
+            pos = neg = 0
+            for literal in (term.xs if isinstance(term, AndOp) else [term]):
+                if isinstance(literal, Complement):
+                    neg |= 1 << variable_table.id_of(Not(literal))
+                else:
+                    pos |= 1 << variable_table.id_of(literal)
+            cubes.add((pos, neg))
+        return CubeSet(frozenset(cubes))
+
+    @staticmethod
+    def literal(id, negative=False):
+        mask = 1 << id
+        return CubeSet(frozenset([(0, mask) if negative else (mask, 0)]))
+
+    def union(self, other):
+        truncated = self.truncated or other.truncated
+        if not other.cubes and truncated == self.truncated:
+            return self
+        if not self.cubes and truncated == other.truncated:
+            return other
+        return CubeSet(CubeSet._absorb_union(self.cubes, other.cubes), truncated)
+
+    @staticmethod
+    def union_all(cube_sets):
+        # Unites pairwise in rounds, as product_all multiplies.
+        cube_sets = list(cube_sets)
+        while len(cube_sets) > 1:
+            unions = [cube_sets[i].union(cube_sets[i+1])
+                for i in range(0, len(cube_sets) - 1, 2)]
+            if len(cube_sets) % 2:
+                unions.append(cube_sets[-1])
+            cube_sets = unions
+        return cube_sets[0] if cube_sets else CubeSet()
+
+    @staticmethod
+    def product_all(cube_sets, max_literals=None):
+        # Multiplies pairwise in rounds, as a balanced tree: the factors of
+        # each product stay of comparable size.
+        cube_sets = list(cube_sets)
+        while len(cube_sets) > 1:
+            products = [cube_sets[i].product(cube_sets[i+1], max_literals)
+                for i in range(0, len(cube_sets) - 1, 2)]
+            if len(cube_sets) % 2:
+                products.append(cube_sets[-1])
+            cube_sets = products
+        return cube_sets[0] if cube_sets else CubeSet.constant(True)
+
+    def product(self, other, max_literals=None):
+        if not self.cubes or (other.cubes == frozenset([(0, 0)]) and not other.truncated):
+            return self
+        if not other.cubes or (self.cubes == frozenset([(0, 0)]) and not self.truncated):
+            return other
+        truncated = self.truncated or other.truncated
+
+        # A cube implied by a cube of the other side is in the product as it
+        # is, and absorbs every other product it takes part in.
+        cubes = set()
+        rows = []
+        for cube in self.cubes:
+            if CubeSet._any_subset(other.cubes, *cube):
+                cubes.add(cube)
+            else:
+                rows.append(cube)
+        columns = []
+        for cube in other.cubes:
+            if CubeSet._any_subset(self.cubes, *cube):
+                cubes.add(cube)
+            else:
+                columns.append(cube)
+
+        for pos, neg in rows:
+            for other_pos, other_neg in columns:
+                cube_pos = pos | other_pos
+                cube_neg = neg | other_neg
+                if cube_pos & cube_neg:
+                    continue
+                if (max_literals is not None and
+                        bin(cube_pos).count('1') + bin(cube_neg).count('1') > max_literals):
+                    truncated = True
+                    continue
+                cubes.add((cube_pos, cube_neg))
+        return CubeSet(CubeSet._absorb(cubes), truncated)
+
+    def support(self):
+        support = 0
+        for pos, neg in self.cubes:
+            support |= pos | neg
+        return support
+
+    def shift(self, variable_table, delta):
+        ids = {}
+        def shift_mask(mask):
+            shifted = 0
+            for id in CubeSet._ids(mask):
+                if id not in ids:
+                    ids[id] = 1 << variable_table.shift(id, delta)
+                shifted |= ids[id]
+            return shifted
+        return CubeSet(
+            frozenset((shift_mask(pos), shift_mask(neg)) for pos, neg in self.cubes),
+            self.truncated)
+
+    def to_expr(self, variable_table):
+        xs = []
+        for pos, neg in sorted(self.cubes, key=CubeSet._cube_key):
+            literals = []
+            for id in CubeSet._ids(pos):
+                literals.append(variable_table.expr(id))
+            for id in CubeSet._ids(neg):
+                literals.append(Not(variable_table.expr(id)))
+            xs.append(And(*literals))
+        return Or(*xs)
+
+    def minimize(self, variable_table, partition_size, workers=1):
+        # Runs espresso on partitions of at most partition_size cubes, in
+        # parallel when workers > 1, and merges the minimized partitions
+        # with a global absorption pass. Partitions with disjoint supports
+        # cannot share an implicant, so splitting by support loses nothing;
+        # larger components are cut into windows of cubes sorted by step,
+        # which keeps the result equivalent but possibly not as small as a
+        # single espresso call over everything.
+        partitions = [CubeSet(frozenset(cubes)).literals(variable_table)
+            for cubes in self._partition(variable_table, partition_size)]
+
+        if workers > 1 and len(partitions) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(partitions))) as executor:
+                minimized = list(executor.map(_espresso_worker, partitions))
+        else:
+            minimized = [_espresso_worker(partition) for partition in partitions]
+
+        literals = []
+        for partition in minimized:
+            literals.extend(partition)
+        return CubeSet.from_literals(literals, variable_table)
+
+    def _partition(self, variable_table, partition_size):
+        parents = {}
+        def find(id):
+            while parents.setdefault(id, id) != id:
+                parents[id] = parents[parents[id]]
+                id = parents[id]
+            return id
+
+        for pos, neg in self.cubes:
+            ids = list(CubeSet._ids(pos | neg))
+            for id in ids[1:]:
+                parents[find(id)] = find(ids[0])
+
+        components = {}
+        for cube in self.cubes:
+            support = cube[0] | cube[1]
+            root = find(next(CubeSet._ids(support))) if support else None
+            components.setdefault(root, []).append(cube)
+
+        def latest_step(cube):
+            return max([variable_table.variable(id)[1]
+                for id in CubeSet._ids(cube[0] | cube[1])] + [-1])
+
+        partitions = []
+        current = []
+        for cubes in sorted(components.values(), key=len):
+            if len(cubes) > partition_size:
+                cubes = sorted(cubes, key=lambda cube: (latest_step(cube), cube))
+                for i in range(0, len(cubes), partition_size):
+                    partitions.append(cubes[i:i+partition_size])
+                continue
+            if len(current) + len(cubes) > partition_size:
+                partitions.append(current)
+                current = []
+            current.extend(cubes)
+        if current:
+            partitions.append(current)
+        return partitions
+
+    def literals(self, variable_table):
+        # The cubes as (symbol, step) pairs, independent of the table ids:
+        # this is the form CubeSets are exchanged in between processes.
+        return tuple(
+            (tuple(variable_table.variable(id) for id in CubeSet._ids(pos)),
+             tuple(variable_table.variable(id) for id in CubeSet._ids(neg)))
+            for pos, neg in self.cubes)
+
+    @staticmethod
+    def from_literals(literals, variable_table):
+        cubes = set()
+        for positives, negatives in literals:
+            pos = 0
+            for symbol, step in positives:
+                pos |= 1 << variable_table.id(symbol, step)
+            neg = 0
+            for symbol, step in negatives:
+                neg |= 1 << variable_table.id(symbol, step)
+            cubes.add((pos, neg))
+        return CubeSet(CubeSet._absorb(cubes))
+
+    @staticmethod
+    def _absorb(cubes):
+        # Keeps the minimal cubes. Every kept cube is filed under its least
+        # frequent literal (a bit of pos, or minus a bit of neg), so a
+        # candidate is only checked against the kept cubes filed under its
+        # own literals: a cube absorbing it has all of its literals in the
+        # candidate, the one it is filed under included.
+        if (0, 0) in cubes:
+            return frozenset([(0, 0)])
+        if not cubes:
+            return frozenset()
+
+        cubes = sorted(cubes, key=CubeSet._cube_key)
+        absorbed = []
+        if len(cubes) <= max(ABSORB_SCAN_SIZE, CubeSet._cube_key(cubes[-1])[0]):
+            # Too few cubes for the index to pay for splitting them into
+            # literals: they are scanned.
+            for cube in cubes:
+                if not CubeSet._any_subset(absorbed, *cube):
+                    absorbed.append(cube)
+            return frozenset(absorbed)
+
+        cube_literals = [CubeSet._literals(*cube) for cube in cubes]
+        frequency = CubeSet._frequency(cube_literals)
+
+        index = {}
+        for cube, literals in zip(cubes, cube_literals):
+            if not CubeSet._indexed_subset(index, cube, literals):
+                absorbed.append(cube)
+                index.setdefault(min(literals, key=frequency.get), []).append(cube)
+        return frozenset(absorbed)
+
+    @staticmethod
+    def _absorb_union(cubes, other):
+        # Absorbs the union of two sets of minimal cubes, as every CubeSet
+        # keeps: a cube of one side can then only be absorbed by a cube of
+        # the other one, so each side is only checked against the other.
+        if (0, 0) in cubes or (0, 0) in other:
+            return frozenset([(0, 0)])
+        common = cubes & other
+        return common.union(
+            CubeSet._unabsorbed(cubes - common, other),
+            CubeSet._unabsorbed(other - common, cubes))
+
+    @staticmethod
+    def _unabsorbed(candidates, cubes):
+        # The candidates no cube of cubes is a subset of. When either side
+        # is small the candidates are scanned against cubes, otherwise they
+        # are looked up in an index of cubes by literal.
+        if len(candidates) <= ABSORB_SCAN_SIZE or len(cubes) <= ABSORB_SCAN_SIZE:
+            return [cube for cube in candidates if not CubeSet._any_subset(cubes, *cube)]
+
+        cube_literals = [CubeSet._literals(*cube) for cube in cubes]
+        frequency = CubeSet._frequency(cube_literals)
+        index = {}
+        for cube, literals in zip(cubes, cube_literals):
+            index.setdefault(min(literals, key=frequency.get), []).append(cube)
+
+        unabsorbed = []
+        for cube in candidates:
+            pos, neg = cube
+            if len(index) < bin(pos).count('1') + bin(neg).count('1'):
+                absorbed = any(
+                    (pos if literal > 0 else neg) & abs(literal) and
+                    CubeSet._any_subset(kept_cubes, pos, neg)
+                    for literal, kept_cubes in index.items())
+            else:
+                absorbed = CubeSet._indexed_subset(index, cube, CubeSet._literals(pos, neg))
+            if not absorbed:
+                unabsorbed.append(cube)
+        return unabsorbed
+
+    @staticmethod
+    def _indexed_subset(index, cube, literals):
+        # Whether a cube filed in index under one of literals, the ones of
+        # cube, is a subset of it.
+        pos, neg = cube
+        for literal in literals:
+            kept_cubes = index.get(literal)
+            if kept_cubes and CubeSet._any_subset(kept_cubes, pos, neg):
+                return True
+        return False
+
+    @staticmethod
+    def _frequency(cube_literals):
+        frequency = {}
+        for literals in cube_literals:
+            for literal in literals:
+                frequency[literal] = frequency.get(literal, 0) + 1
+        return frequency
+
+    @staticmethod
+    def _literals(pos, neg):
+        return list(CubeSet._bits(pos)) + [-low for low in CubeSet._bits(neg)]
+
+    @staticmethod
+    def _any_subset(cubes, pos, neg):
+        for kept_pos, kept_neg in cubes:
+            if not (kept_pos & ~pos or kept_neg & ~neg):
+                return True
+        return False
+
+    @staticmethod
+    def _cube_key(cube):
+        return (bin(cube[0]).count('1') + bin(cube[1]).count('1'), cube)
+
+    @staticmethod
+    def _bits(mask):
+        while mask:
+            low = mask & -mask
+            yield low
+            mask ^= low
+
+    @staticmethod
+    def _ids(mask):
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def __len__(self):
+        return len(self.cubes)
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return False
+        return self.cubes == other.cubes and self.truncated == other.truncated
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((self.cubes, self.truncated))
+
+
+def _espresso_worker(literals):
+    variable_table = VariableTable()
+    formula = CubeSet.from_literals(literals, variable_table).to_expr(variable_table)
+    if not isinstance(formula, Atom) and formula.is_dnf():
+        formula = espresso_exprs(formula)[0]
+    return CubeSet.from_expr(formula, variable_table).literals(variable_table)
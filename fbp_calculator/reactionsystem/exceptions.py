@@ -9,3 +9,11 @@ class ExceptionReactionSystem():
     class InvalidNumber(Exception): pass
     class InvalidFormula(Exception): pass
     class InvalidContextSet(Exception): pass
+    class InvalidEngine(Exception): pass
+
+    class Cancelled(Exception):
+        # result: what the query returned when it was cancelled, which
+        # implies (and is not in general equivalent to) the exact result.
+        def __init__(self, result=None):
+            super(ExceptionReactionSystem.Cancelled, self).__init__()
+            self.result = result
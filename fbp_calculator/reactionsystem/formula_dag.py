@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+from fbp_calculator.reactionsystem.boolean_wrap import (
+    Not,
+    Constant,
+    Variable,
+    Complement,
+    AndOp,
+    OrAndOp)
+from fbp_calculator.reactionsystem.exceptions import ExceptionReactionSystem
+
+
+# Hash-consed formulas: every distinct subformula is a node, an integer
+# index, and equal subformulas (up to the order of the operands of And
+# and Or) are the same node, whichever cause they come from.
+class FormulaDag():
+    CONSTANT = 0
+    VARIABLE = 1
+    COMPLEMENT = 2
+    AND = 3
+    OR = 4
+
+    def __init__(self):
+        self._ids = {}
+        self._nodes = []
+
+    def node(self, formula):
+        nodes = {}
+        stack = [formula]
+        while stack:
+            formula = stack[-1]
+            if formula in nodes:
+                stack.pop()
+                continue
+
+            if isinstance(formula, Constant):
+                nodes[formula] = self.intern(FormulaDag.CONSTANT, bool(formula.VALUE))
+            elif isinstance(formula, Variable):
+                nodes[formula] = self.intern(FormulaDag.VARIABLE, formula.name)
+            elif isinstance(formula, Complement):
+                nodes[formula] = self.intern(FormulaDag.COMPLEMENT,
+                    self.intern(FormulaDag.VARIABLE, Not(formula).name))
+            elif isinstance(formula, OrAndOp):
+                missing = [x for x in formula.xs if x not in nodes]
+                if missing:
+                    stack.extend(missing)
+                    continue
+                kind = FormulaDag.AND if isinstance(formula, AndOp) else FormulaDag.OR
+                nodes[formula] = self.operator(kind, [nodes[x] for x in formula.xs])
+            else:
+                raise ExceptionReactionSystem.InvalidFormula()
+            stack.pop()
+
+        return nodes[formula]
+
+    def operator(self, kind, operands):
+        operands = tuple(sorted(set(operands)))
+        if len(operands) == 1:
+            return operands[0]
+        return self.intern(kind, operands)
+
+    def intern(self, kind, value):
+        key = (kind, value)
+        try:
+            return self._ids[key]
+        except KeyError:
+            self._ids[key] = len(self._nodes)
+            self._nodes.append(key)
+            return self._ids[key]
+
+    def kind(self, node):
+        return self._nodes[node][0]
+
+    def value(self, node):
+        return self._nodes[node][1]
+
+    def __len__(self):
+        return len(self._nodes)
@@ -3,7 +3,6 @@
 from fbp_calculator.reactionsystem.boolean_wrap import (
     Not,
     And,
-    ONE,
     var)
 
 from fbp_calculator.reactionsystem.exceptions import ExceptionReactionSystem
@@ -81,6 +80,7 @@ class Reaction:
         setR = Reaction._create_symbol_set(R)
         if len(setR) == 0: raise ExceptionReactionSystem.ReactantSetCannotBeEmpty()
         self._R = setR
+        self._ap = None
 
 
     @property
@@ -104,15 +104,20 @@ class Reaction:
     def I(self, I):
         setI = Reaction._create_symbol_set(I)
         self._I = setI
+        self._ap = None
 
 
     def ap(self):
-        f = ONE
-        for symbol in self.R:
-            f = And(f, var(symbol))
-        for symbol in self.I:
-            f = And(f, Not(var(symbol)))
-        return f
+        if self._ap is None:
+            self._ap = And(*(
+                [var(symbol) for symbol in self.R] +
+                [Not(var(symbol)) for symbol in self.I]))
+        return self._ap
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_ap'] = None
+        return state
 
 
     def __eq__(self, other):
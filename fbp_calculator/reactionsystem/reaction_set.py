@@ -1,18 +1,107 @@
 # -*- coding: utf-8 -*-
 
 from fbp_calculator.reactionsystem.boolean_wrap import (Or, ZERO)
-    
+
 from fbp_calculator.reactionsystem.reaction import Reaction
 from fbp_calculator.reactionsystem.exceptions import ExceptionReactionSystem
 
 
 class ReactionSet(set):
+    def __init__(self, reactions=()):
+        super(ReactionSet, self).__init__()
+        self._products = {}
+        self.update(reactions)
+
     def cause(self, symbol):
         Reaction._check_symbol(symbol)
 
-        cause = ZERO
-        for reaction in self:
-            if symbol in reaction.P:
-                cause = Or(cause, reaction.ap())
-        return cause
+        reactions = self._products.get(symbol)
+        if not reactions:
+            return ZERO
+        return Or(*[reaction.ap() for reaction in reactions])
+
+    def producers(self, symbol):
+        return self._products.get(symbol, frozenset())
+
+
+    def add(self, reaction):
+        if reaction in self:
+            return
+        super(ReactionSet, self).add(reaction)
+        for symbol in reaction.P:
+            self._products.setdefault(symbol, set()).add(reaction)
+
+    def discard(self, reaction):
+        if reaction not in self:
+            return
+        super(ReactionSet, self).discard(reaction)
+        for symbol in reaction.P:
+            reactions = self._products[symbol]
+            reactions.discard(reaction)
+            if not reactions:
+                del self._products[symbol]
+
+    def remove(self, reaction):
+        if reaction not in self:
+            raise KeyError(reaction)
+        self.discard(reaction)
+
+    def pop(self):
+        if not self:
+            raise KeyError('pop from an empty set')
+        reaction = next(iter(self))
+        self.discard(reaction)
+        return reaction
+
+    def clear(self):
+        super(ReactionSet, self).clear()
+        self._products = {}
+
+    def update(self, *others):
+        for other in others:
+            for reaction in other:
+                self.add(reaction)
+
+    def difference_update(self, *others):
+        for other in others:
+            for reaction in list(other):
+                self.discard(reaction)
+
+    def intersection_update(self, *others):
+        keep = set(self).intersection(*others)
+        for reaction in list(self):
+            if reaction not in keep:
+                self.discard(reaction)
+
+    def symmetric_difference_update(self, other):
+        for reaction in set(other):
+            if reaction in self:
+                self.discard(reaction)
+            else:
+                self.add(reaction)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        self.symmetric_difference_update(other)
+        return self
+
+    def copy(self):
+        copy = self.__class__()
+        super(ReactionSet, copy).update(self)
+        for symbol, reactions in self._products.items():
+            copy._products[symbol] = set(reactions)
+        return copy
 
+    def __reduce__(self):
+        return (self.__class__, (list(self),))
@@ -17,7 +17,12 @@ from fbp_calculator.reactionsystem.boolean_wrap import (
     OrAndOp,
     ZERO,
     ONE,
-    var)
+    var,
+    bddvar,
+    bdd2expr,
+    BDDZERO,
+    BDDONE,
+    satisfy_one)
 
 from fbp_calculator.reactionsystem.reaction import Reaction
 from fbp_calculator.reactionsystem.reaction_set import ReactionSet
@@ -25,143 +30,895 @@ from fbp_calculator.reactionsystem.exceptions import ExceptionReactionSystem
 
 from fbp_calculator.reactionsystem.fbs_iterate_item import FbsIterateItem
 from fbp_calculator.reactionsystem.fbs_calculated_item import FbsCalculatedItem
+from fbp_calculator.reactionsystem.cube_set import CubeSet
+from fbp_calculator.reactionsystem.variable_table import VariableTable
+from fbp_calculator.reactionsystem.fbs_cache import FbsCache
+from fbp_calculator.reactionsystem.formula_dag import FormulaDag
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from bisect import bisect_left
+from functools import reduce
+from itertools import islice
+
+import operator
 import sys
-if 'time' in sys.argv:
-    import time
+import time
+
+
+ENGINE_DNF = 'dnf'
+ENGINE_BDD = 'bdd'
+ENGINE_SAT = 'sat'
+
+FIXPOINT_MAX_PERIOD = 8
+# The steps above the last context step the fixpoint looks for a repeat in.
+FIXPOINT_WINDOW = 32
+
+MINIMIZE_PARTITION_THRESHOLD = 20000
+MINIMIZE_PARTITION_SIZE = 1000
+
+# The context-free templates kept across fbp calls, least recently used
+# first out, when no cache_size is given.
+TEMPLATE_CACHE_SIZE = 4096
+
+PHASE_EXPAND = 'expand'
+PHASE_ENUMERATE = 'enumerate'
+PHASE_MINIMIZE = 'minimize'
+
+# With a progress callback set, it is called at most every
+# PROGRESS_INTERVAL seconds while a query runs.
+PROGRESS_INTERVAL = 0.5
 
 
 class ReactionSystem():
-    def __init__(self, A):
-        reactant_set = set()
-        for reaction in A:
-            reactant_set = reactant_set.union(reaction.P)
+    def __init__(self, A, cache_size=None):
+        self._reaction_set = A.copy()
+        self._dependencies = {}
+        for reaction in self._reaction_set:
+            dependencies = reaction.R.union(reaction.I)
+            for symbol in reaction.P:
+                self._dependencies.setdefault(symbol, set()).update(dependencies)
+        # Without inhibitors every cause, and so every fbs, is monotone.
+        self._monotone = all(not reaction.I for reaction in self._reaction_set)
         self._causes = {}
-        for reactant in reactant_set:
-            self._causes[reactant] = A.cause(reactant)
+        self._variables = VariableTable()
+        self._templates = FbsCache(cache_size or TEMPLATE_CACHE_SIZE)
+        self._cache = FbsCache(cache_size) if cache_size else None
+        self._dag = FormulaDag()
+        self._cause_nodes = {}
+        self.statistics = {}
+        self.progress = None
+        self.cancelled = None
 
     def cause(self, symbol):
-        return self._causes.get(symbol, ZERO)
+        try:
+            return self._causes[symbol]
+        except KeyError:
+            if symbol in self._dependencies:
+                cause = self._reaction_set.cause(symbol)
+            else:
+                cause = ZERO
+            self._causes[symbol] = cause
+            return cause
+
+    def clear_cache(self):
+        self._templates.clear()
+        if self._cache is not None:
+            self._cache.clear()
+
+    def dependencies(self, symbol):
+        return self._dependencies.get(symbol, frozenset())
+
+    def backward_slice(self, symbols, steps):
+        # The causes of the symbols reached within steps backward hops are
+        # the only ones fbp(symbols, steps) can expand; their dependencies
+        # only show up as time-indexed variables.
+        expanded = set(symbols)
+        frontier = expanded
+        for _ in range(steps):
+            reached = set()
+            for symbol in frontier:
+                reached.update(self.dependencies(symbol))
+            frontier = reached - expanded
+            if not frontier:
+                break
+            expanded.update(frontier)
+
+        symbol_slice = set(expanded)
+        reaction_slice = set()
+        for symbol in expanded:
+            symbol_slice.update(self.dependencies(symbol))
+            reaction_slice.update(self._reaction_set.producers(symbol))
+        return frozenset(symbol_slice), frozenset(reaction_slice)
+
+    def fbp(self, symbols, steps, context_given=set(), context_not_given=set(),
+            engine=ENGINE_DNF, workers=1, max_literals=None, top_k=None, limit=None):
+        # max_literals drops, while expanding, every cube with more literals;
+        # top_k keeps only the top_k cubes with fewest literals; limit stops
+        # the sat engine after that many cubes. Either way the formula
+        # implies fbp(symbols, steps), and is equivalent to it when no cube
+        # was dropped. With max_literals or top_k, statistics['truncated']
+        # tells whether one was.
+        if max_literals is None and top_k is None:
+            if limit is not None and engine != ENGINE_SAT:
+                raise ExceptionReactionSystem.InvalidEngine()
+            formula = self._fbp(
+                symbols, steps, context_given, context_not_given, engine, [steps],
+                workers, limit)[0]
+            self._check_cancelled(formula)
+            return formula
+
+        symbolSet = Reaction._create_symbol_set(symbols)
+        self._check_query(steps, context_given, context_not_given, engine, workers)
+        for bound in (max_literals, top_k):
+            if bound is not None and (not isinstance(bound, int) or bound < 1):
+                raise ExceptionReactionSystem.InvalidNumber()
+        if engine != ENGINE_DNF or limit is not None:
+            raise ExceptionReactionSystem.InvalidEngine()
+
+        if top_k is None:
+            self._begin_query(
+                [symbolSet], steps, context_given, context_not_given, max_literals)
+            cubes = self._fbs_target(symbolSet, steps, [steps])[0]
+            self.statistics['truncated'] = cubes.truncated
+            self._end_query()
+        else:
+            cubes = list(islice(self._iter_cubes(
+                symbolSet, steps, context_given, context_not_given, max_literals),
+                top_k + 1))
+            if len(cubes) > top_k:
+                self.statistics['truncated'] = True
+            cubes = CubeSet(frozenset(cubes[:top_k]))
+        formula = self._minimize_cubes(cubes, 1)
+        self._check_cancelled(formula)
+        return formula
+
+    def fbp_sweep(self, symbols, max_steps, context_given=set(), context_not_given=set(),
+            engine=ENGINE_DNF):
+        # fbp(symbols, steps) for every steps in 0..max_steps, sharing the memo:
+        # the expansions below step n are the same for every horizon above n.
+        formulas = self._fbp(
+            symbols, max_steps, context_given, context_not_given, engine,
+            range(max_steps + 1), 1)
+        self._check_cancelled(formulas)
+        return formulas
+
+    def fbp_many(self, symbol_sets, steps, context_given=set(), context_not_given=set(),
+            engine=ENGINE_DNF, workers=1):
+        # Yields (symbols, formula) for each target as soon as it is computed.
+        # The targets share the memo, so the expansions they have in common
+        # are computed once; other fbp calls on this instance must not be
+        # interleaved with the iteration. With more than one worker the
+        # targets are computed in parallel and yielded in completion order.
+        targets = [(symbols, Reaction._create_symbol_set(symbols))
+            for symbols in symbol_sets]
+        self._check_query(steps, context_given, context_not_given, engine, workers)
+        return self._fbp_many(
+            targets, steps, context_given, context_not_given, engine, workers)
+
+    def iter_predictors(self, symbols, steps, context_given=set(), context_not_given=set()):
+        # Yields the cubes of fbp(symbols, steps) one at a time, by
+        # non-decreasing number of literals. The expansion is redone with a
+        # bound of 1, 2, 4, ... literals, each round keeping only the cubes
+        # within the bound and yielding the ones longer than the previous
+        # bound, until a round drops nothing. The cubes are the
+        # minimal ones of the expansion: on inhibitor-free systems they are
+        # the cubes fbp returns, otherwise espresso may merge some of them.
+        symbolSet = Reaction._create_symbol_set(symbols)
+        self._check_query(steps, context_given, context_not_given, ENGINE_DNF)
+        return self._iter_predictors(symbolSet, steps, context_given, context_not_given)
 
-    def fbp(self, symbols, steps, context_given=set(), context_not_given=set()):
+    def _iter_predictors(self, symbolSet, steps, context_given, context_not_given):
+        for cube in self._iter_cubes(symbolSet, steps, context_given, context_not_given):
+            yield CubeSet(frozenset([cube])).to_expr(self._variables)
+
+    def _iter_cubes(self, symbolSet, steps, context_given, context_not_given,
+            max_literals=None):
+        shorter = -1
+        bound = 1
+        while True:
+            if max_literals is not None:
+                bound = min(bound, max_literals)
+            self._begin_query(
+                [symbolSet], steps, context_given, context_not_given, bound)
+            cubes = self._fbs_target(symbolSet, steps, [steps])[0]
+            self.statistics['truncated'] = cubes.truncated
+            self._end_query()
+
+            for cube in sorted(cubes.cubes, key=CubeSet._cube_key):
+                if CubeSet._cube_key(cube)[0] > shorter:
+                    yield cube
+            if not cubes.truncated or bound == max_literals or self._cancel:
+                break
+            shorter = bound
+            bound *= 2
+
+    def _fbp_many(self, targets, steps, context_given, context_not_given, engine, workers):
+        self._begin_query(
+            [symbolSet for _, symbolSet in targets], steps,
+            context_given, context_not_given)
+
+        if workers > 1 and engine == ENGINE_DNF:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {}
+                for symbols, symbolSet in targets:
+                    future = executor.submit(_fbs_worker,
+                        self._reaction_set, steps, self._cg, self._cng,
+                        self._terms(self._target(symbolSet)))
+                    futures[future] = symbols
+                for future in as_completed(futures):
+                    cubes = CubeSet.from_literals(future.result(), self._variables)
+                    yield futures[future], self._minimize_cubes(cubes, 1)
+        else:
+            for symbols, symbolSet in targets:
+                formula = self._fbp_target(symbolSet, steps, engine, [steps])[0]
+                self._check_cancelled(formula)
+                yield symbols, formula
+
+        self._end_query()
+
+    def _fbp(self, symbols, steps, context_given, context_not_given, engine, horizons,
+            workers, limit=None):
         symbolSet = Reaction._create_symbol_set(symbols)
+        self._check_query(steps, context_given, context_not_given, engine, workers)
+        if limit is not None and (not isinstance(limit, int) or limit < 1):
+            raise ExceptionReactionSystem.InvalidNumber()
+        self._begin_query([symbolSet], steps, context_given, context_not_given)
+        formulas = self._fbp_target(symbolSet, steps, engine, horizons, workers, limit)
+        self._end_query()
+        return formulas
+
+    def _check_query(self, steps, context_given, context_not_given, engine, workers=1):
         if not isinstance(steps, int) or steps < 0:
                 raise ExceptionReactionSystem.InvalidNumber()
+        if not isinstance(workers, int) or workers < 1:
+                raise ExceptionReactionSystem.InvalidNumber()
         if (not isinstance(context_given, set) or 
             not isinstance(context_not_given, set)):
                 raise ExceptionReactionSystem.InvalidContextSet()
-        
+        if engine not in (ENGINE_DNF, ENGINE_BDD, ENGINE_SAT):
+                raise ExceptionReactionSystem.InvalidEngine()
+
+    def _begin_query(self, symbol_sets, steps, context_given, context_not_given,
+            max_literals=None):
+        self._max_literals = max_literals
         self._cg = context_given
         self._cng = context_not_given
+        context_steps = [step for step, _ in context_given.union(context_not_given)]
+        self._context_floor = min(context_steps + [steps + 1])
+        self._context_ceiling = max(context_steps + [-1])
 
         self._calculated_items = {}
+        self._node_items = {}
+        self._fingerprints = {}
+        self._clauses = [(1,)]
+        self._gates = {}
+        self._sat_variables = {}
+        self._sat_count = 1
 
         if 'time' in sys.argv:
-            start = time.time()
+            self._start = time.time()
 
-        formula = ONE
-        for symbol in symbolSet:
-            formula = And(formula, self.cause(symbol))
-            formula = formula.to_dnf()
-        
-        formula = self._fbs_iterative(formula, steps)
-        
-        if not isinstance(formula, Atom) and formula.is_dnf():
-            formula = espresso_exprs(formula)[0]
+        self._cancel = False
+        self._phases = {}
+        self._phase = None
+        self._progress_time = 0.0
+        self._progress_cubes = 0
+
+        symbol_slice, reaction_slice = self.backward_slice(
+            set().union(*symbol_sets), steps)
+        self.statistics = {
+            'slice_symbols': len(symbol_slice),
+            'slice_reactions': len(reaction_slice),
+            'template_hits': 0,
+            'cache_hits': 0,
+            'negations': 0,
+            'node_hits': 0,
+            'node_expansions': 0}
+        self._enter_phase(PHASE_EXPAND)
 
+    def _end_query(self):
+        # node_reuse is the share of the operator nodes reached during the
+        # query whose result was already memoized.
+        lookups = self.statistics['node_hits'] + self.statistics['node_expansions']
+        self.statistics['dag_nodes'] = len(self._dag)
+        self.statistics['node_reuse'] = \
+            float(self.statistics['node_hits']) / lookups if lookups else 0.0
         if 'time' in sys.argv:
-            print(time.time() - start)
+            print(time.time() - self._start)
+            for key in sorted(self.statistics):
+                print('{}: {}'.format(key, self.statistics[key]))
+
+    def _poll_cancelled(self):
+        # Once the query is cancelled, no symbol is expanded any further:
+        # the traversals finish on what is already computed, so that the
+        # result is an under-approximation of the exact one.
+        if not self._cancel and self.cancelled is not None and self.cancelled():
+            self._cancel = True
+        return self._cancel
+
+    def _check_cancelled(self, result):
+        if self._cancel:
+            raise ExceptionReactionSystem.Cancelled(result)
+
+    def _enter_phase(self, phase):
+        now = time.time()
+        if self._phase is not None:
+            self._phases[self._phase] = \
+                self._phases.get(self._phase, 0.0) + now - self._phase_start
+        self._phase = phase
+        self._phase_start = now
+        if self.progress is not None:
+            self._report(force=True)
+
+    def _tick(self, stack, step, cubes=None):
+        if cubes is not None:
+            self._progress_cubes = max(self._progress_cubes, cubes)
+        self._report(len(stack), step, cubes)
+
+    def _report(self, stack=0, step=None, cubes=None, force=False):
+        # Calls the progress callback with a snapshot of the query: the
+        # phase, the step and stack depth of the traversal, the memoized
+        # results, the cubes of the last (and of the largest) intermediate
+        # result and the seconds spent in each phase so far.
+        now = time.time()
+        if not force and now - self._progress_time < PROGRESS_INTERVAL:
+            return
+        self._progress_time = now
+
+        elapsed = dict(self._phases)
+        elapsed[self._phase] = elapsed.get(self._phase, 0.0) + now - self._phase_start
+        self.progress({
+            'phase': self._phase,
+            'step': step,
+            'stack': stack,
+            'memo': len(self._calculated_items) + len(self._node_items),
+            'cubes': cubes,
+            'max_cubes': self._progress_cubes,
+            'max_literals': self._max_literals,
+            'elapsed': elapsed})
+
+    def _fbp_target(self, symbolSet, steps, engine, horizons, workers=1, limit=None):
+        if engine == ENGINE_BDD:
+            formula = And(*[self.cause(symbol) for symbol in symbolSet])
+            formulas = []
+            for horizon in horizons:
+                bdd = self._fbs_bdd(formula, horizon)
+                self._enter_phase(PHASE_MINIMIZE)
+                formulas.append(self._minimize(bdd2expr(bdd)))
+            return formulas
+        if engine == ENGINE_SAT:
+            formula = And(*[self.cause(symbol) for symbol in symbolSet])
+            return [self._minimize_cubes(self._fbs_sat(formula, horizon, limit), 1)
+                for horizon in horizons]
 
+        if workers > 1:
+            results = [self._fbs_parallel(self._target(symbolSet), steps, workers)]
+        else:
+            results = self._fbs_target(symbolSet, steps, horizons)
+        
+        return [self._minimize_cubes(cubes, workers) for cubes in results]
+
+    def _fbs_target(self, symbolSet, steps, horizons):
+        self._enter_phase(PHASE_EXPAND)
+        factors, symbols = self._cause_cubes(symbolSet)
+        target = self._multiply(factors)
+        self.statistics['target_cubes'] = len(target)
+        formula = self._untimed_expr(target, symbols)
+
+        self._fbs_fixpoint(formula, steps, horizons)
+        if len(target) > sum(len(factor) for factor in factors):
+            # The causes have many alternatives and their DNF blew up:
+            # fbs distributes over the conjunction, so each cause is
+            # expanded on its own and the expansions are multiplied.
+            return [self._fbs_conjunction(symbolSet, horizon) for horizon in horizons]
+        return [self._fbs_iterative(formula, horizon) for horizon in horizons]
+
+    def _target(self, symbolSet):
+        factors, symbols = self._cause_cubes(symbolSet)
+        return self._untimed_expr(self._multiply(factors), symbols)
+
+    def _cause_cubes(self, symbolSet):
+        # The causes of the symbols as CubeSets over the symbols without a
+        # step, whose ids are kept in the returned table.
+        symbols = VariableTable()
+        factors = set()
+        for symbol in symbolSet:
+            cause = self.cause(symbol)
+            if isinstance(cause, Constant):
+                factors.add(CubeSet.constant(cause.VALUE))
+                continue
+            cubes = set()
+            for term in (cause.xs if isinstance(cause, OrOp) else [cause]):
+                pos = neg = 0
+                for literal in (term.xs if isinstance(term, AndOp) else [term]):
+                    if isinstance(literal, Complement):
+                        neg |= 1 << symbols.id(Not(literal).name, None)
+                    else:
+                        pos |= 1 << symbols.id(literal.name, None)
+                cubes.add((pos, neg))
+            factors.add(CubeSet(CubeSet._absorb(cubes)))
+        return factors, symbols
+
+    @staticmethod
+    def _untimed_expr(cubes, symbols):
+        xs = []
+        for pos, neg in sorted(cubes.cubes, key=CubeSet._cube_key):
+            xs.append(And(*(
+                [var(symbols.variable(id)[0]) for id in CubeSet._ids(pos)] +
+                [Not(var(symbols.variable(id)[0])) for id in CubeSet._ids(neg)])))
+        return Or(*xs)
+
+    def _fbs_conjunction(self, symbolSet, step):
+        return self._multiply(set(
+                self._fbs_iterative(self.cause(symbol), step) for symbol in symbolSet),
+            self._max_literals)
+
+    @staticmethod
+    def _multiply(factors, max_literals=None):
+        # Multiplies smallest first, preferring the factors sharing variables
+        # with the product so far, whose contradictory and absorbed cubes
+        # drop out early.
+        factors = sorted(factors, key=len)
+        result = CubeSet.constant(True)
+        while factors and result.cubes:
+            support = result.support()
+            factor = min(factors,
+                key=lambda factor: (not factor.support() & support, len(factor)))
+            factors.remove(factor)
+            result = result.product(factor, max_literals)
+        return result
+
+    def _minimize_cubes(self, cubes, workers):
+        self._enter_phase(PHASE_MINIMIZE)
+        # The minimal cubes of a monotone DNF are its prime implicants and
+        # form its only minimal DNF: absorption has already found it.
+        if self._monotone or self._cancel:
+            return cubes.to_expr(self._variables)
+
+        # A single espresso call over a large DNF can take longer than the
+        # expansion: with several workers it is split across them instead,
+        # at the price of a less reduced (but equivalent) formula.
+        if workers > 1 and len(cubes) > MINIMIZE_PARTITION_THRESHOLD:
+            cubes = cubes.minimize(self._variables, MINIMIZE_PARTITION_SIZE, workers)
+            return cubes.to_expr(self._variables)
+        return self._minimize(cubes.to_expr(self._variables))
+
+    @staticmethod
+    def _minimize(formula):
+        if not isinstance(formula, Atom) and formula.is_dnf():
+            return espresso_exprs(formula)[0]
         return formula
 
-    def _fbs_iterative(self, formula, step):
+    @staticmethod
+    def _terms(formula):
+        # The cubes of the DNF formula as (symbol, negative) pairs, the form
+        # the subproblems are shipped to the worker processes in.
+        if isinstance(formula, Constant):
+            return ((),) if formula.VALUE else ()
+        terms = formula.xs if isinstance(formula, OrOp) else [formula]
+        return tuple(
+            tuple((Not(literal).name, True) if isinstance(literal, Complement)
+                    else (literal.name, False)
+                for literal in (term.xs if isinstance(term, AndOp) else [term]))
+            for term in terms)
+
+    def _fbs_parallel(self, formula, steps, workers):
+        # fbs distributes over the top-level disjuncts of the target: each
+        # worker expands its share of them against its own memo, and the
+        # partial results are merged here.
+        terms = self._terms(formula)
+        chunks = [terms[i::workers] for i in range(min(workers, len(terms)))]
+        self.statistics['subproblems'] = len(chunks)
+
+        result = CubeSet.constant(False)
+        with ProcessPoolExecutor(max_workers=max(len(chunks), 1)) as executor:
+            futures = [executor.submit(_fbs_worker,
+                    self._reaction_set, steps, self._cg, self._cng, chunk)
+                for chunk in chunks]
+            for future in as_completed(futures):
+                result = result.union(
+                    CubeSet.from_literals(future.result(), self._variables))
+        return result
+
+    def _fbs_fixpoint(self, formula, steps, horizons):
+        # Computes fbs bottom-up, one step at a time, for the (symbol, inv_nf)
+        # pairs the top-down pass reaches at that step. If, above the last
+        # context step, the results at some step are the ones p steps below
+        # with every index shifted by p, every later step repeats with
+        # period p: the entries the top-down pass of each horizon reaches
+        # size hops down, where every pair is on a cycle of the causes, are
+        # then obtained by shifting instead of expanding. Models that do not
+        # repeat within FIXPOINT_WINDOW steps above the last context step
+        # are left to the top-down pass, which reuses the entries computed
+        # so far.
+        layers, size = self._signed_layers(formula)
+        if not size:
+            return
+
+        # A walk of size hops or more goes around a cycle: deeper than that,
+        # the pairs reached are taken to be all of the ones on a walk of any
+        # length, a superset closed under causes, which the repeat needs.
+        cycles = frozenset().union(*layers[size:])
+
+        history = []
+        for step in range(min(steps, self._context_ceiling + FIXPOINT_WINDOW) + 1):
+            current = {}
+            for horizon in horizons[bisect_left(horizons, step):]:
+                hops = horizon - step
+                pairs = cycles if hops >= size else layers[hops]
+                for pair in pairs:
+                    if pair not in current:
+                        symbol, inv_nf = pair
+                        current[pair] = self._fbs_iterative(var(symbol), step, inv_nf)
+                if hops >= size:
+                    break
+            if self._cancel:
+                return
+            history.append(current)
+
+            period = self._fixpoint_period(history)
+            if period:
+                break
+        else:
+            return
+
+        self.statistics['fixpoint_step'] = step
+        self.statistics['fixpoint_period'] = period
+
+        for horizon in horizons:
+            top = horizon - size
+            if top <= step:
+                continue
+            base = step - (step - top) % period
+            for pair in layers[size]:
+                symbol, inv_nf = pair
+                self._calculated_items[FbsCalculatedItem(symbol, top, inv_nf)] = \
+                    history[base][pair].shift(self._variables, top - base)
+
+    def _fixpoint_period(self, history):
+        step = len(history) - 1
+        current = history[step]
+        for period in range(1, min(step, FIXPOINT_MAX_PERIOD) + 1):
+            if self._context_ceiling > step - period:
+                break
+            previous = history[step - period]
+            if all(pair in previous and len(previous[pair]) == len(current[pair])
+                    for pair in current) and \
+                    all(previous[pair].shift(self._variables, period) == current[pair]
+                        for pair in current):
+                return period
+        return 0
+
+    def _signed_layers(self, formula):
+        # The (symbol, inv_nf) pairs exactly k backward hops from formula,
+        # where inv_nf flips under each negation, for k up to twice the
+        # number of pairs reachable at all, and that number. Once a layer
+        # repeats, the ones after it are copied instead of computed.
+        successors = {}
+        layers = [frozenset(self._signed_symbols(formula, False))]
+        seen = {layers[0]: 0}
+        pairs = set(layers[0])
+        period = 0
+        while len(layers) <= 2 * len(pairs) + 1:
+            if period:
+                layers.append(layers[-period])
+                continue
+            layer = set()
+            for pair in layers[-1]:
+                if pair not in successors:
+                    symbol, inv_nf = pair
+                    successors[pair] = self._signed_symbols(self.cause(symbol), inv_nf)
+                layer.update(successors[pair])
+            layer = frozenset(layer)
+            if layer in seen:
+                period = len(layers) - seen[layer]
+            seen[layer] = len(layers)
+            pairs.update(layer)
+            layers.append(layer)
+        return layers, len(pairs)
+
+    @staticmethod
+    def _signed_symbols(formula, inv_nf):
+        signed_symbols = set()
+        stack = [(formula, inv_nf)]
+        while stack:
+            formula, inv_nf = stack.pop()
+            if isinstance(formula, Variable):
+                signed_symbols.add((formula.name, inv_nf))
+            elif isinstance(formula, Complement):
+                stack.append((Not(formula), not inv_nf))
+            elif isinstance(formula, OrAndOp):
+                for x in formula.xs:
+                    stack.append((x, inv_nf))
+        return signed_symbols
+
+    def _fingerprint(self, symbol, step):
+        # The context entries fbs(symbol, step) can depend on: (k, s) is
+        # one of them if s is reached from symbol in exactly step-k hops.
+        root = (symbol, step)
+        stack = [root]
+        while stack:
+            key = stack[-1]
+            if key in self._fingerprints:
+                stack.pop()
+                continue
+
+            symbol, step = key
+            if step < self._context_floor:
+                self._fingerprints[key] = frozenset()
+                stack.pop()
+                continue
+
+            childs = []
+            if step > 0:
+                childs = [(dependency, step-1) for dependency in self.dependencies(symbol)]
+            missing = [child for child in childs if child not in self._fingerprints]
+            if missing:
+                stack.extend(missing)
+                continue
+
+            stack.pop()
+            fingerprint = set()
+            if (step, symbol) in self._cg:
+                fingerprint.add((step, symbol, True))
+            elif (step, symbol) in self._cng:
+                fingerprint.add((step, symbol, False))
+            for child in childs:
+                fingerprint.update(self._fingerprints[child])
+            self._fingerprints[key] = frozenset(fingerprint)
+
+        return self._fingerprints[root]
+
+    def _fbs_iterative(self, formula, step, inv_nf=False):
+        # Negations are pushed down to the time-indexed literals: an item
+        # with inv_nf set computes the DNF of the negation of its fbs, by De
+        # Morgan, so every result is a DNF and no CNF is ever built.
+        # The formula is walked as a node of the hash-consed DAG, and the
+        # result of every operator node is memoized for the query per step
+        # and inv_nf: equal subformulas of different causes are expanded once.
+        dag = self._dag
         stack = [FbsIterateItem(
-                formula=formula,
+                formula=dag.node(formula),
                 parent=None,
                 step=step,
-                inv_nf=False)]
+                inv_nf=inv_nf)]
         
         while True:
+            if self.cancelled is not None:
+                self._poll_cancelled()
             item = stack.pop()
-            formula = item.formula
+            node = item.formula
+            kind = dag.kind(node)
 
-            if isinstance(formula, Constant):
-                result = formula
+            if kind == FormulaDag.CONSTANT:
+                result = CubeSet.constant(dag.value(node) != item.inv_nf)
 
                 
-            elif isinstance(formula, Variable):
-                symbol = formula.name
+            elif kind == FormulaDag.VARIABLE:
+                symbol = dag.value(node)
                 step = item.step
                 inv_nf = item.inv_nf
 
+                # Below the lowest context step the result does not depend
+                # on the query, so it is kept as a template across fbp calls;
+                # results truncated to max_literals, or cut short by a
+                # cancellation, are kept for the query only.
+                reusable = self._max_literals is None
+                context_free = reusable and step < self._context_floor
+
                 fbs_calculated_item = FbsCalculatedItem(symbol, step, inv_nf)
+                cache_key = None
+                if self._cache is not None and reusable and not context_free:
+                    cache_key = (
+                        fbs_calculated_item, self._fingerprint(symbol, step))
+
                 if fbs_calculated_item in self._calculated_items:
                     result = self._calculated_items[fbs_calculated_item]
 
+                elif context_free and fbs_calculated_item in self._templates:
+                    result = self._templates.get(fbs_calculated_item)
+                    self._calculated_items[fbs_calculated_item] = result
+                    self.statistics['template_hits'] += 1
+
+                elif cache_key is not None and item.remained and cache_key in self._cache:
+                    result = self._cache.get(cache_key)
+                    self._calculated_items[fbs_calculated_item] = result
+                    self.statistics['cache_hits'] += 1
+
                 else:
-                    if not step or not item.remained:
+                    if not step or not item.remained or self._cancel:
                         if (step, symbol) in self._cg:
-                            result = ONE
+                            result = CubeSet.constant(not inv_nf)
                         elif (step, symbol) in self._cng:
-                            result = ZERO
+                            result = CubeSet.constant(inv_nf)
                         else:
-                            result = var('{}_{}'.format(symbol, step))
+                            result = CubeSet.literal(
+                                self._variables.id(symbol, step), negative=inv_nf)
+                        if step and item.remained and inv_nf:
+                            # Cancelled, without the cause: x_step alone
+                            # implies fbs, only ZERO implies its negation.
+                            result = CubeSet.constant(False)
                         
                     elif item.remained:
                             item.remained = 1
 
                             stack.append(FbsIterateItem(
-                                formula=self.cause(symbol),
+                                formula=self._cause_node(symbol),
                                 parent=item,
                                 step=step-1,
                                 inv_nf=inv_nf))
                             continue
                         
-                    if step > 0:
-                        result = Or(result, item.childs[0])
+                    if step > 0 and not item.remained:
+                        if inv_nf:
+                            result = result.product(item.childs[0], self._max_literals)
+                        else:
+                            result = result.union(item.childs[0])
 
-                    result = result.to_cnf() if inv_nf else result.to_dnf()
                     self._calculated_items[fbs_calculated_item] = result
+                    if self._cancel:
+                        pass
+                    elif context_free:
+                        self._templates.put(fbs_calculated_item, result)
+                    elif cache_key is not None:
+                        self._cache.put(cache_key, result)
 
-            elif isinstance(formula, Complement):
+            elif kind == FormulaDag.COMPLEMENT:
                 if item.remained:
                     item.remained = 1
+                    self.statistics['negations'] += 1
                     
                     stack.append(FbsIterateItem(
-                        formula=Not(formula),
+                        formula=dag.value(node),
                         parent=item,
                         step=item.step,
                         inv_nf=not item.inv_nf))
                     continue
                 
                 else:
-                    result = Not(item.childs[0])
+                    result = item.childs[0]
 
 
-            elif isinstance(formula, OrAndOp):
-                Op = And if isinstance(formula, AndOp) else Or
+            else:
+                node_item = (node, item.step, item.inv_nf)
 
-                if item.remained:
-                    item.remained = 2
+                if node_item in self._node_items:
+                    result = self._node_items[node_item]
+                    self.statistics['node_hits'] += 1
 
+                elif item.remained:
+                    item.remained = len(dag.value(node))
+                    for operand in dag.value(node):
+                        stack.append(FbsIterateItem(
+                            formula=operand,
+                            parent=item,
+                            step=item.step,
+                            inv_nf=item.inv_nf))
+                    continue
+                
+                else:
+                    # All the operands are merged at once: products as a
+                    # balanced tree, unions with a single absorption pass.
+                    if (kind == FormulaDag.AND) != item.inv_nf:
+                        result = CubeSet.product_all(item.childs, self._max_literals)
+                    else:
+                        result = CubeSet.union_all(item.childs)
+                    self._node_items[node_item] = result
+                    self.statistics['node_expansions'] += 1
+            
+            if self.progress is not None:
+                self._tick(stack, item.step, len(result))
+
+            if item.parent == None:
+                break
+            else:
+                item.parent.remained -= 1
+                item.parent.childs.append(result)
+                if not item.parent.remained:
+                    stack.append(item.parent)
+                continue
+
+
+        return result
+
+    def _cause_node(self, symbol):
+        try:
+            return self._cause_nodes[symbol]
+        except KeyError:
+            self._cause_nodes[symbol] = self._dag.node(self.cause(symbol))
+            return self._cause_nodes[symbol]
+
+    def _fbs_bdd(self, formula, step):
+        # fbs over BDDs: negation is cheap and canonical, so there is no need
+        # to keep a separate CNF memo (inv_nf) for the complemented symbols.
+        self._enter_phase(PHASE_EXPAND)
+        return self._fbs_walk(formula, step, BDDZERO, BDDONE,
+            ReactionSystem._bdd_variable, operator.invert, ReactionSystem._bdd_gate)
+
+    @staticmethod
+    def _bdd_variable(symbol, step):
+        return bddvar('{}_{}'.format(symbol, step))
+
+    @staticmethod
+    def _bdd_gate(conjunction, childs):
+        return reduce(operator.and_ if conjunction else operator.or_, childs)
+
+    def _fbs_walk(self, formula, step, zero, one, variable, negate, gate):
+        # Same traversal as _fbs_iterative, over any representation in which
+        # negation needs no separate memo: zero and one are its constants,
+        # variable(symbol, step) a symbol that is not in the context,
+        # negate(x) the complement of x and gate(conjunction, childs) the And
+        # (or Or) of childs. A cancelled walk returns zero.
+        stack = [FbsIterateItem(
+                formula=formula,
+                parent=None,
+                step=step,
+                inv_nf=False)]
+
+        while True:
+            if self._poll_cancelled():
+                return zero
+            item = stack.pop()
+            formula = item.formula
+
+            if isinstance(formula, Constant):
+                result = one if formula.VALUE else zero
+
+            elif isinstance(formula, Variable):
+                symbol = formula.name
+                step = item.step
+
+                fbs_calculated_item = FbsCalculatedItem(symbol, step, False)
+                if fbs_calculated_item in self._calculated_items:
+                    result = self._calculated_items[fbs_calculated_item]
+
+                else:
+                    if step and item.remained:
+                        stack.append(FbsIterateItem(
+                            formula=self.cause(symbol),
+                            parent=item,
+                            step=step-1,
+                            inv_nf=False))
+                        continue
+
+                    if (step, symbol) in self._cg:
+                        result = one
+                    elif (step, symbol) in self._cng:
+                        result = zero
+                    else:
+                        result = variable(symbol, step)
+
+                    if step > 0:
+                        result = gate(False, [result, item.childs[0]])
+
+                    self._calculated_items[fbs_calculated_item] = result
+
+            elif isinstance(formula, Complement):
+                if item.remained:
                     stack.append(FbsIterateItem(
-                        formula=formula.xs[0],
-                        parent=item,
-                        step=item.step,
-                        inv_nf=item.inv_nf))
-                    stack.append(FbsIterateItem(
-                        formula=Op(*formula.xs[1:]),
+                        formula=Not(formula),
                         parent=item,
                         step=item.step,
-                        inv_nf=item.inv_nf))
+                        inv_nf=False))
                     continue
-                
-                else:
-                    result = Op(item.childs[0], item.childs[1])
 
+                result = negate(item.childs[0])
 
-            result = result.to_cnf() if item.inv_nf else result.to_dnf()
-            
+            elif isinstance(formula, OrAndOp):
+                if item.remained:
+                    item.remained = len(formula.xs)
+                    for x in formula.xs:
+                        stack.append(FbsIterateItem(
+                            formula=x,
+                            parent=item,
+                            step=item.step,
+                            inv_nf=False))
+                    continue
+
+                result = gate(isinstance(formula, AndOp), item.childs)
+
+            if self.progress is not None:
+                self._tick(stack, item.step)
 
             if item.parent == None:
                 break
@@ -176,6 +933,119 @@ class ReactionSystem():
         return result
         
     
+    def _fbs_sat(self, formula, step, limit=None):
+        # Enumerates prime implicants of fbs(formula, step) over the context
+        # variables: a model of the CNF that no cube found so far covers is
+        # shrunk to a prime implicant, whose negation is then added to the
+        # CNF. Without a limit the cubes found cover every model.
+        self._enter_phase(PHASE_EXPAND)
+        root = self._fbs_cnf(formula, step)
+        self._enter_phase(PHASE_ENUMERATE)
+        variables = {}
+        for key, sat_id in self._sat_variables.items():
+            variables[sat_id] = self._variables.id(*key)
+
+        clauses = self._clauses + [(root,)]
+        cubes = set()
+        while limit is None or len(cubes) < limit:
+            if self._poll_cancelled():
+                break
+            point = satisfy_one(self._sat_count, clauses)
+            if point is None:
+                break
+
+            cube = self._sat_justify(root, point)
+            for literal in list(cube):
+                reduced = [x for x in cube if x != literal]
+                if satisfy_one(self._sat_count, self._clauses,
+                        assumptions=reduced + [-root]) is None:
+                    cube = reduced
+
+            pos = neg = 0
+            for literal in cube:
+                if literal > 0:
+                    pos |= 1 << variables[literal]
+                else:
+                    neg |= 1 << variables[-literal]
+            cubes.add((pos, neg))
+            if self.progress is not None:
+                self._report(cubes=len(cubes))
+            if not cube:
+                break
+            clauses.append(tuple(-literal for literal in cube))
+
+        self.statistics['sat_variables'] = self._sat_count
+        self.statistics['sat_clauses'] = len(self._clauses)
+        return CubeSet(frozenset(cubes))
+
+    def _fbs_cnf(self, formula, step):
+        # fbs as a Tseitin encoding in self._clauses: the result is the
+        # literal of a variable equivalent to fbs(formula, step), 1 standing
+        # for ONE and -1 for ZERO.
+        return self._fbs_walk(formula, step, -1, 1,
+            self._sat_variable, operator.neg, self._sat_gate)
+
+    def _sat_variable(self, symbol, step):
+        key = (symbol, step)
+        if key not in self._sat_variables:
+            self._sat_count += 1
+            self._sat_variables[key] = self._sat_count
+        return self._sat_variables[key]
+
+    def _sat_gate(self, conjunction, literals):
+        # A variable equivalent to the And (or Or) of the literals. The
+        # constants are simplified away, so that the contexts do not add
+        # variables to the CNF.
+        absorbing = -1 if conjunction else 1
+        literals = set(literals)
+        literals.discard(-absorbing)
+        if absorbing in literals or literals & set(-x for x in literals):
+            return absorbing
+        if not literals:
+            return -absorbing
+        if len(literals) == 1:
+            return literals.pop()
+
+        self._sat_count += 1
+        gate = self._sat_count
+        self._gates[gate] = (conjunction, literals)
+        if conjunction:
+            self._clauses.extend((-gate, x) for x in literals)
+            self._clauses.append(tuple([gate] + [-x for x in literals]))
+        else:
+            self._clauses.extend((gate, -x) for x in literals)
+            self._clauses.append(tuple([-gate] + list(literals)))
+        return gate
+
+    def _sat_justify(self, literal, point):
+        # The context literals of a point that already fix the value of
+        # literal: a true And (or false Or) needs all of its inputs, a false
+        # And (or true Or) just one of them, preferably one already needed.
+        def value(literal):
+            return point[abs(literal)-1] * literal > 0
+
+        cube = []
+        seen = set()
+        stack = [literal]
+        while stack:
+            literal = stack.pop()
+            if literal in seen:
+                continue
+            seen.add(literal)
+            if abs(literal) not in self._gates:
+                if literal != 1:
+                    cube.append(literal)
+                continue
+
+            conjunction, inputs = self._gates[abs(literal)]
+            inputs = [x if literal > 0 else -x for x in inputs]
+            if (literal > 0) == conjunction:
+                stack.extend(inputs)
+            else:
+                inputs = [x for x in inputs if value(x)]
+                stack.append(min(inputs, key=lambda x: x not in seen))
+        return sorted(cube, key=abs)
+
     def _fbs(self, formula, step, inv_nf=False):
         if isinstance(formula, Constant):
             pass
@@ -223,16 +1093,29 @@ class ReactionSystem():
     def __eq__(self, other):
         if not isinstance(other, self.__class__):
             return False
-        return self._causes == other._causes
+        return self._reaction_set == other._reaction_set
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash(self._causes)
+        return hash(frozenset(self._reaction_set))
 
     def __str__(self):
-        return 'ReactionSystem({})'.format(str(self._causes))
+        causes = {}
+        for symbol in self._dependencies:
+            causes[symbol] = self.cause(symbol)
+        return 'ReactionSystem({})'.format(str(causes))
 
     def __repr__(self):
         return str(self)
+
+
+def _fbs_worker(reaction_set, steps, context_given, context_not_given, terms):
+    rs = ReactionSystem(reaction_set)
+    rs._begin_query([], steps, context_given, context_not_given)
+    formula = Or(*[And(*[Not(var(symbol)) if negative else var(symbol)
+            for symbol, negative in term])
+        for term in terms])
+    rs._fbs_fixpoint(formula, steps, [steps])
+    return rs._fbs_iterative(formula, steps).literals(rs._variables)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+from fbp_calculator.reactionsystem.boolean_wrap import var
+
+
+class VariableTable():
+    def __init__(self):
+        self._ids = {}
+        self._variables = []
+
+    def id(self, symbol, step):
+        key = (symbol, step)
+        try:
+            return self._ids[key]
+        except KeyError:
+            self._ids[key] = len(self._variables)
+            self._variables.append(key)
+            return self._ids[key]
+
+    def id_of(self, variable):
+        symbol, step = variable.name.rsplit('_', 1)
+        return self.id(symbol, int(step))
+
+    def shift(self, id, delta):
+        symbol, step = self._variables[id]
+        return self.id(symbol, step + delta)
+
+    def variable(self, id):
+        return self._variables[id]
+
+    def expr(self, id):
+        return var('{}_{}'.format(*self._variables[id]))
+
+    def __len__(self):
+        return len(self._variables)
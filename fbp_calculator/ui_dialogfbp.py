@@ -28,7 +28,7 @@ class Ui_DialogFBP(object):
         self.textBrowserFormula.setEnabled(False)
         self.textBrowserFormula.setFocusPolicy(QtCore.Qt.StrongFocus)
         self.textBrowserFormula.setObjectName("textBrowserFormula")
-        self.gridLayout.addWidget(self.textBrowserFormula, 7, 0, 1, 2)
+        self.gridLayout.addWidget(self.textBrowserFormula, 7, 0, 1, 3)
         self.labelSteps = QtWidgets.QLabel(DialogFBP)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Preferred)
         sizePolicy.setHorizontalStretch(0)
@@ -63,7 +63,23 @@ class Ui_DialogFBP(object):
         self.toolButtonSave.setAutoRaise(True)
         self.toolButtonSave.setObjectName("toolButtonSave")
         self.gridLayout_2.addWidget(self.toolButtonSave, 0, 5, 1, 1)
-        self.gridLayout.addLayout(self.gridLayout_2, 5, 0, 1, 2)
+        self.toolButtonStop = QtWidgets.QToolButton(DialogFBP)
+        icon = QtGui.QIcon.fromTheme("process-stop")
+        self.toolButtonStop.setIcon(icon)
+        self.toolButtonStop.setIconSize(QtCore.QSize(18, 18))
+        self.toolButtonStop.setAutoRaise(True)
+        self.toolButtonStop.setObjectName("toolButtonStop")
+        self.gridLayout_2.addWidget(self.toolButtonStop, 0, 6, 1, 1)
+        self.checkBoxAllHorizons = QtWidgets.QCheckBox(DialogFBP)
+        self.checkBoxAllHorizons.setEnabled(False)
+        self.checkBoxAllHorizons.setObjectName("checkBoxAllHorizons")
+        self.gridLayout_2.addWidget(self.checkBoxAllHorizons, 1, 1, 1, 1)
+        self.spinBoxHorizon = QtWidgets.QSpinBox(DialogFBP)
+        self.spinBoxHorizon.setEnabled(False)
+        self.spinBoxHorizon.setMinimum(1)
+        self.spinBoxHorizon.setObjectName("spinBoxHorizon")
+        self.gridLayout_2.addWidget(self.spinBoxHorizon, 1, 3, 1, 4)
+        self.gridLayout.addLayout(self.gridLayout_2, 5, 0, 1, 3)
         self.labelSymbols = QtWidgets.QLabel(DialogFBP)
         self.labelSymbols.setObjectName("labelSymbols")
         self.gridLayout.addWidget(self.labelSymbols, 1, 0, 1, 1)
@@ -78,6 +94,20 @@ class Ui_DialogFBP(object):
         self.lineEditSteps.setReadOnly(True)
         self.lineEditSteps.setObjectName("lineEditSteps")
         self.gridLayout.addWidget(self.lineEditSteps, 2, 1, 1, 1)
+        self.labelBounds = QtWidgets.QLabel(DialogFBP)
+        self.labelBounds.setObjectName("labelBounds")
+        self.gridLayout.addWidget(self.labelBounds, 1, 2, 1, 1)
+        self.lineEditBounds = QtWidgets.QLineEdit(DialogFBP)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.lineEditBounds.sizePolicy().hasHeightForWidth())
+        self.lineEditBounds.setSizePolicy(sizePolicy)
+        self.lineEditBounds.setMinimumSize(QtCore.QSize(50, 0))
+        self.lineEditBounds.setFocusPolicy(QtCore.Qt.NoFocus)
+        self.lineEditBounds.setReadOnly(True)
+        self.lineEditBounds.setObjectName("lineEditBounds")
+        self.gridLayout.addWidget(self.lineEditBounds, 2, 2, 1, 1)
         self.tableWidgetFormula = QtWidgets.QTableWidget(DialogFBP)
         self.tableWidgetFormula.setEnabled(False)
         self.tableWidgetFormula.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
@@ -97,7 +127,7 @@ class Ui_DialogFBP(object):
         self.tableWidgetFormula.verticalHeader().setVisible(False)
         self.tableWidgetFormula.verticalHeader().setDefaultSectionSize(25)
         self.tableWidgetFormula.verticalHeader().setMinimumSectionSize(0)
-        self.gridLayout.addWidget(self.tableWidgetFormula, 9, 0, 1, 2)
+        self.gridLayout.addWidget(self.tableWidgetFormula, 9, 0, 1, 3)
         self.listFormula = QtWidgets.QListWidget(DialogFBP)
         self.listFormula.setEnabled(False)
         self.listFormula.setFocusPolicy(QtCore.Qt.StrongFocus)
@@ -108,16 +138,17 @@ class Ui_DialogFBP(object):
         self.listFormula.setHorizontalScrollMode(QtWidgets.QAbstractItemView.ScrollPerPixel)
         self.listFormula.setUniformItemSizes(False)
         self.listFormula.setObjectName("listFormula")
-        self.gridLayout.addWidget(self.listFormula, 8, 0, 1, 2)
+        self.gridLayout.addWidget(self.listFormula, 8, 0, 1, 3)
         self.line = QtWidgets.QFrame(DialogFBP)
         self.line.setFrameShape(QtWidgets.QFrame.HLine)
         self.line.setFrameShadow(QtWidgets.QFrame.Sunken)
         self.line.setObjectName("line")
-        self.gridLayout.addWidget(self.line, 3, 0, 1, 2)
+        self.gridLayout.addWidget(self.line, 3, 0, 1, 3)
 
         self.retranslateUi(DialogFBP)
         QtCore.QMetaObject.connectSlotsByName(DialogFBP)
         DialogFBP.setTabOrder(self.lineEditSymbols, self.lineEditSteps)
+        DialogFBP.setTabOrder(self.lineEditSteps, self.lineEditBounds)
 
     def retranslateUi(self, DialogFBP):
         _translate = QtCore.QCoreApplication.translate
@@ -128,7 +159,12 @@ class Ui_DialogFBP(object):
         self.comboBoxFormulaType.setItemText(2, _translate("DialogFBP", "Table"))
         self.labelComputing.setText(_translate("DialogFBP", "Computing"))
         self.toolButtonSave.setText(_translate("DialogFBP", "Save As"))
+        self.toolButtonStop.setToolTip(_translate("DialogFBP", "Stop and show the predictors found so far"))
+        self.toolButtonStop.setText(_translate("DialogFBP", "Stop"))
+        self.checkBoxAllHorizons.setText(_translate("DialogFBP", "Show all horizons"))
+        self.spinBoxHorizon.setPrefix(_translate("DialogFBP", "Horizon: "))
         self.labelSymbols.setText(_translate("DialogFBP", "Symbols:"))
+        self.labelBounds.setText(_translate("DialogFBP", "Bounds:"))
 
 
 if __name__ == "__main__":
@@ -138,6 +138,26 @@ class Ui_MainWindowFBP(object):
         self.spinBoxCalculatorSteps.setMaximum(9999)
         self.spinBoxCalculatorSteps.setObjectName("spinBoxCalculatorSteps")
         self.gridLayout.addWidget(self.spinBoxCalculatorSteps, 2, 1, 1, 1)
+        self.labelMaxLiterals = QtWidgets.QLabel(self.groupBoxCalculator)
+        self.labelMaxLiterals.setMinimumSize(QtCore.QSize(50, 0))
+        self.labelMaxLiterals.setObjectName("labelMaxLiterals")
+        self.gridLayout.addWidget(self.labelMaxLiterals, 1, 2, 1, 1)
+        self.spinBoxCalculatorMaxLiterals = QtWidgets.QSpinBox(self.groupBoxCalculator)
+        self.spinBoxCalculatorMaxLiterals.setMinimumSize(QtCore.QSize(50, 0))
+        self.spinBoxCalculatorMaxLiterals.setMinimum(0)
+        self.spinBoxCalculatorMaxLiterals.setMaximum(9999)
+        self.spinBoxCalculatorMaxLiterals.setObjectName("spinBoxCalculatorMaxLiterals")
+        self.gridLayout.addWidget(self.spinBoxCalculatorMaxLiterals, 2, 2, 1, 1)
+        self.labelTopK = QtWidgets.QLabel(self.groupBoxCalculator)
+        self.labelTopK.setMinimumSize(QtCore.QSize(50, 0))
+        self.labelTopK.setObjectName("labelTopK")
+        self.gridLayout.addWidget(self.labelTopK, 1, 3, 1, 1)
+        self.spinBoxCalculatorTopK = QtWidgets.QSpinBox(self.groupBoxCalculator)
+        self.spinBoxCalculatorTopK.setMinimumSize(QtCore.QSize(50, 0))
+        self.spinBoxCalculatorTopK.setMinimum(0)
+        self.spinBoxCalculatorTopK.setMaximum(999999)
+        self.spinBoxCalculatorTopK.setObjectName("spinBoxCalculatorTopK")
+        self.gridLayout.addWidget(self.spinBoxCalculatorTopK, 2, 3, 1, 1)
         self.gridLayout_5.addLayout(self.gridLayout, 0, 0, 1, 2)
         self.pushButtonCalculate = QtWidgets.QPushButton(self.groupBoxCalculator)
         self.pushButtonCalculate.setEnabled(False)
@@ -259,7 +279,9 @@ class Ui_MainWindowFBP(object):
         MainWindowFBP.setTabOrder(self.lineEditInhibitors, self.pushButtonAdd)
         MainWindowFBP.setTabOrder(self.pushButtonAdd, self.lineEditCalculatorSymbols)
         MainWindowFBP.setTabOrder(self.lineEditCalculatorSymbols, self.spinBoxCalculatorSteps)
-        MainWindowFBP.setTabOrder(self.spinBoxCalculatorSteps, self.pushButtonCalculate)
+        MainWindowFBP.setTabOrder(self.spinBoxCalculatorSteps, self.spinBoxCalculatorMaxLiterals)
+        MainWindowFBP.setTabOrder(self.spinBoxCalculatorMaxLiterals, self.spinBoxCalculatorTopK)
+        MainWindowFBP.setTabOrder(self.spinBoxCalculatorTopK, self.pushButtonCalculate)
         MainWindowFBP.setTabOrder(self.pushButtonCalculate, self.tableWidgetProperties)
         MainWindowFBP.setTabOrder(self.tableWidgetProperties, self.pushButtonDelete)
         MainWindowFBP.setTabOrder(self.pushButtonDelete, self.listWidgetReactions)
@@ -286,6 +308,12 @@ class Ui_MainWindowFBP(object):
         self.lineEditCalculatorSymbols.setStatusTip(_translate("MainWindowFBP", "Example: A B C"))
         self.labelSteps.setText(_translate("MainWindowFBP", "Steps:"))
         self.spinBoxCalculatorSteps.setStatusTip(_translate("MainWindowFBP", "Example: 3"))
+        self.labelMaxLiterals.setText(_translate("MainWindowFBP", "Max literals:"))
+        self.spinBoxCalculatorMaxLiterals.setStatusTip(_translate("MainWindowFBP", "Drop the predictors with more literals while calculating (Off: no bound)"))
+        self.spinBoxCalculatorMaxLiterals.setSpecialValueText(_translate("MainWindowFBP", "Off"))
+        self.labelTopK.setText(_translate("MainWindowFBP", "Top k:"))
+        self.spinBoxCalculatorTopK.setStatusTip(_translate("MainWindowFBP", "Keep only the k predictors with fewest literals (Off: all of them)"))
+        self.spinBoxCalculatorTopK.setSpecialValueText(_translate("MainWindowFBP", "Off"))
         self.pushButtonCalculate.setStatusTip(_translate("MainWindowFBP", "Calculate formula based predictor"))
         self.pushButtonCalculate.setText(_translate("MainWindowFBP", "Calculate"))
         self.label_3.setText(_translate("MainWindowFBP", "Context properties:"))